@@ -1,17 +1,25 @@
+import time
+start_time = time.perf_counter() # before the imports below, for --startup-profile
+
 import os
 import sys
 from logging import getLogger, Formatter, INFO, StreamHandler, DEBUG
 from PySide6.QtWidgets import (
     QApplication,
 )
+from PySide6.QtCore import QTimer
+import PySide6
 from models.config_manager import ConfigManager
 from controllers.status_bar_controller import StatusBarController
 from views.main_window import MainWindow
 from models.api_client_manager import APIClientManager
-from utils.setting import json_path, log_path, log_backup_count, log_max_bytes, db_path
+from models.provider_registry import ProviderRegistry
+from utils.setting import json_path, log_path, log_backup_count, log_max_bytes, db_path, cache_db_path, n_history
+from utils.startup_profile import StartupProfile
 
 from controllers.main_controller import MainController
 from models.database_manager import DatabaseManager
+from models.response_cache import ResponseCache
 
 
 def main():
@@ -45,17 +53,32 @@ def main():
         logger.addHandler(fh)
 
     logger.info("App started")
+    if sys.version_info < (3, 12) and PySide6.__version_info__[:2] >= (6, 12):
+        logger.warning(f"PySide6 {PySide6.__version__} miscounts references on Python {sys.version.split()[0]} and the app may crash: use Python 3.12 or PySide6 < 6.12")
+
+    # the window is shown first; the history and the provider SDKs are loaded afterwards
+    profile = StartupProfile(logger, start_time, "--startup-profile" in sys.argv, pending=["history loaded", "SDKs imported"])
+    profile.mark("imports")
 
     config_manager = ConfigManager(json_path, logger)
     config = config_manager.config
+    profile.mark("config")
 
-    api_clients_manager = APIClientManager(logger)
+    providers = ProviderRegistry(config, logger)
+    api_clients_manager = APIClientManager(logger, providers, config.max_concurrency, config.timeouts)
 
     app = QApplication(sys.argv)
+    profile.mark("QApplication")
     db = DatabaseManager(logger, db_path)
 
+    cache = None
+    if config.cache["enabled"]:
+        cache = ResponseCache(logger, cache_db_path, config.cache["max_entries"], config.cache["max_age_days"])
+    profile.mark("databases")
+
     main_window = MainWindow(config, api_clients_manager, db, logger)
     status_bar_controller = StatusBarController(main_window, logger)
+    profile.mark("window")
 
     main_controller = MainController(
         main_window.center_panel,
@@ -64,13 +87,27 @@ def main():
         main_window.right_panel,
         api_clients_manager,
         db,
+        cache,
         config,
         status_bar_controller,
         logger
         )
-
+    app.aboutToQuit.connect(main_controller.close)
+    profile.mark("controller")
 
     main_window.show()
+    profile.mark("window shown")
+
+    def load_history():
+        main_controller.populate_table_from_db(n_history)
+        profile.mark("history loaded")
+
+    QTimer.singleShot(0, lambda: profile.mark("event loop started"))
+    QTimer.singleShot(0, load_history)
+    # the requests left unanswered by the last run (crash, sleep, quit)
+    QTimer.singleShot(0, main_controller.resume_outbox)
+    api_clients_manager.preload(done=lambda: profile.mark("SDKs imported"))
+
     sys.exit(app.exec())
 
 
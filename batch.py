@@ -0,0 +1,191 @@
+"""
+Headless batch runner: sends every prompt of a JSONL file and writes the results to another JSONL file.
+
+    python batch.py in.jsonl out.jsonl [--concurrency N] [--record]
+
+Each input line is an object with a "prompt" and a "model" (a model name from config.json),
+and optionally "temperature" (0-10, like the slider) and an "id" that is copied to the output.
+The prompt is parsed like the input area, so conversations separated by #-----# work.
+
+Results are appended to the output file as soon as they arrive, with the input line number,
+so an interrupted run continues where it stopped when started again with the same files;
+lines that failed are sent again then.
+No display server is needed.
+"""
+import sys
+import json
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from logging import getLogger, Formatter, INFO, StreamHandler
+from pathlib import Path
+
+from models.config_manager import ConfigManager
+from models.api_client_manager import APIClientManager
+from models.llm_client_worker import LLMResults, Worker, current_worker
+from models.provider_registry import ProviderRegistry
+from models.request_scheduler import TokenBucket, RequestScheduler, backoff
+from models.database_manager import DatabaseManager
+from utils.setting import json_path, db_path
+
+
+def run_worker(worker: Worker, retry: dict) -> dict:
+    """Run one request in the calling thread, retrying like the RequestScheduler does."""
+    chat = worker.parse_chat()
+    token = current_worker.set(worker)
+    while True:
+        worker.start_attempt()
+        try:
+            response = worker.request(chat)
+            break
+        except Exception as e:
+            if worker.attempt < retry["max_retries"] and worker.is_retryable(e):
+                worker.attempt += 1
+                delay = worker.retry_after(e) or backoff(worker.attempt, retry["base_delay"], retry["max_delay"])
+                worker.logger.warning(f"Retrying {worker.model_key} (attempt {worker.attempt}/{retry['max_retries']}) in {delay:.1f}s: {e}")
+                time.sleep(delay)
+                continue
+            worker.error = True
+            response = worker.error_message(e)
+            break
+    current_worker.reset(token)
+    return worker.result_dict(chat, response)
+
+
+def completed_lines(output_path: Path) -> set:
+    """Input line numbers already answered in the output file, without an error."""
+    done = set()
+    if not output_path.exists():
+        return done
+
+    # drop a line torn by a crash, so that the next result starts on a fresh line
+    data = output_path.read_bytes()
+    if data and not data.endswith(b"\n"):
+        with open(output_path, "r+b") as f:
+            f.truncate(data.rfind(b"\n") + 1)
+
+    with open(output_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+                if not record.get("error"):
+                    done.add(record["line"])
+            except (ValueError, KeyError, AttributeError):
+                continue
+    return done
+
+
+def read_input(input_path: Path, done: set, logger):
+    """Yield (line number, item) lazily, skipping blank, invalid and already answered lines."""
+    with open(input_path, encoding="utf-8") as f:
+        for n, line in enumerate(f, 1):
+            if n in done or not line.strip():
+                continue
+            try:
+                item = json.loads(line)
+            except ValueError as e:
+                logger.error(f"Line {n}: invalid JSON: {e}")
+                continue
+            if "prompt" not in item or "model" not in item:
+                logger.error(f"Line {n}: 'prompt' and 'model' are required")
+                continue
+            yield n, item
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Send the prompts of a JSONL file without the GUI.")
+    parser.add_argument("input", type=Path, help="JSONL file, one {\"prompt\", \"model\"} object per line")
+    parser.add_argument("output", type=Path, help="JSONL file the results are appended to")
+    parser.add_argument("--concurrency", type=int, default=None, help="requests in flight (default: max_concurrency in config.json)")
+    parser.add_argument("--record", action="store_true", help="also store the results in the history table")
+    args = parser.parse_args()
+
+    logger = getLogger(__name__)
+    logger.setLevel(INFO)
+    sh = StreamHandler()
+    sh.setFormatter(Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s"))
+    logger.addHandler(sh)
+
+    config = ConfigManager(json_path, logger).config
+    concurrency = args.concurrency or config.max_concurrency
+    providers = ProviderRegistry(config, logger)
+    clients = APIClientManager(logger, providers, concurrency, config.timeouts)
+    db = DatabaseManager(logger, db_path) if args.record else None
+
+    request_buckets = {provider: TokenBucket(limits.get("requests_per_minute")) for provider, limits in config.rate_limits.items()}
+    token_buckets = {provider: TokenBucket(limits.get("tokens_per_minute")) for provider, limits in config.rate_limits.items()}
+
+    done = completed_lines(args.output)
+    if done:
+        logger.info(f"Resuming: {len(done)} line(s) already answered in {args.output}")
+
+    n_ok = n_error = 0
+    pending = {}
+
+    def collect(futures, out):
+        # results are written from this thread only, one line each, flushed right away
+        nonlocal n_ok, n_error
+        results = []
+        for future in futures:
+            n, item = pending.pop(future)
+            try:
+                result = future.result()
+            except Exception as e:
+                logger.error(f"Line {n}: {e}")
+                n_error += 1
+                continue
+            if result["error"]:
+                n_error += 1
+            else:
+                n_ok += 1
+            record = {"line": n, **({"id": item["id"]} if "id" in item else {}), **result}
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            results.append(LLMResults(**result))
+        out.flush()
+        if db is not None and results:
+            db.insert_history_batch(results)
+
+    with open(args.output, "a", encoding="utf-8") as out, ThreadPoolExecutor(max_workers=concurrency) as executor:
+        try:
+            for n, item in read_input(args.input, done, logger):
+                worker = providers.create_worker(clients, item["prompt"], item["model"], item.get("temperature", 0), logger)
+                if worker is None:
+                    logger.error(f"Line {n}: model not found: {item['model']}")
+                    n_error += 1
+                    continue
+
+                # bounded: never read further ahead than the requests in flight
+                while len(pending) >= concurrency:
+                    finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    collect(finished, out)
+
+                request_bucket = request_buckets.get(worker.provider)
+                if request_bucket is not None:
+                    token_bucket = token_buckets[worker.provider]
+                    tokens = RequestScheduler.estimate_tokens(worker)
+                    now = time.monotonic()
+                    delay = max(request_bucket.wait_time(1, now), token_bucket.wait_time(tokens, now))
+                    if delay > 0:
+                        time.sleep(delay)
+                    request_bucket.consume(1)
+                    token_bucket.consume(tokens)
+
+                pending[executor.submit(run_worker, worker, config.retry)] = (n, item)
+
+            while pending:
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                collect(finished, out)
+        except KeyboardInterrupt:
+            logger.warning("Interrupted, waiting for the requests in flight")
+            finished, _ = wait(pending)
+            collect(finished, out)
+
+    logger.info(f"Done: {n_ok} succeeded, {n_error} failed")
+    clients.close()
+    if db is not None:
+        db.close()
+    return 1 if n_error else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
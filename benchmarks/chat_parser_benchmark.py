@@ -0,0 +1,76 @@
+"""
+Benchmark of ChatParser.parse / to_str on transcripts up to 10 MB.
+
+    python benchmarks/chat_parser_benchmark.py
+
+Both shapes double in size at each step; with linear scaling the time per MB
+stays flat. Exits with status 1 if the largest size is more than twice as
+slow per MB as the smallest.
+"""
+import sys
+import time
+import logging
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from models.chat_parser import ChatParser
+from utils.setting import deliminator, user_prefix, response_prefix, system_prefix
+
+MB = 1024 * 1024
+sizes_mb = [1.25, 2.5, 5, 10]
+turn_text = "Lorem ipsum dolor sit amet, consectetur adipiscing elit. " * 16 # ~1 KB
+
+
+def conversation(size: int) -> str:
+    """Alternating user / assistant turns, like a long Append session."""
+    turns = [f"{system_prefix} You are a helpful assistant.\n"]
+    length = 0
+    while length < size:
+        prefix = user_prefix if len(turns) % 2 else response_prefix
+        turns.append(f"{prefix} {turn_text}\n")
+        length += len(turn_text)
+    return deliminator.join(turns)
+
+
+def one_message(size: int) -> str:
+    """A single user message made of many segments without prefix (merged into one)."""
+    return deliminator.join([f"{user_prefix} start"] + [turn_text] * (size // len(turn_text)))
+
+
+def best_of(function, repeat=3) -> float:
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = ChatParser(logging.getLogger(__name__))
+    linear = True
+
+    for name, make in [("conversation", conversation), ("one message", one_message)]:
+        print(f"{name}:")
+        print(f"{'size':>8} {'messages':>9} {'parse':>10} {'to_str':>10} {'parse/MB':>10}")
+        per_mb = []
+        for size_mb in sizes_mb:
+            text = make(int(size_mb * MB))
+            chat = parser.parse(text)
+            parse_s = best_of(lambda: parser.parse(text))
+            to_str_s = best_of(lambda: parser.to_str(chat))
+            per_mb.append((parse_s + to_str_s) / size_mb)
+            print(f"{size_mb:>6.2f}MB {len(chat):>9} {parse_s * 1000:>8.1f}ms {to_str_s * 1000:>8.1f}ms {parse_s / size_mb * 1000:>8.1f}ms")
+
+        ratio = per_mb[-1] / per_mb[0]
+        print(f"time per MB, {sizes_mb[-1]}MB vs {sizes_mb[0]}MB: x{ratio:.2f}\n")
+        linear = linear and ratio < 2
+
+    print("linear" if linear else "NOT linear")
+    return 0 if linear else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,33 @@
+"""
+Offline compaction of the history database: compresses the prompts and responses stored
+uncompressed (by earlier versions) and VACUUMs the file to give the space back.
+
+    python compact.py [--db llm_client.db]
+
+Close the app first. Search keeps working, the full-text index is left as it is.
+"""
+import argparse
+from logging import getLogger, Formatter, INFO, StreamHandler
+
+from models.database_manager import DatabaseManager
+from utils.setting import db_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compress the history database and give the space back.")
+    parser.add_argument("--db", default=db_path, help=f"history database (default: {db_path})")
+    args = parser.parse_args()
+
+    logger = getLogger(__name__)
+    logger.setLevel(INFO)
+    sh = StreamHandler()
+    sh.setFormatter(Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s"))
+    logger.addHandler(sh)
+
+    db = DatabaseManager(logger, args.db)
+    db.compact()
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,84 +1,199 @@
 from views.main_window import CenterPanel
+from views.session_panel import SessionPanel
 from views.menu_bar import MenuBar
 from views.history_panel import HistoryPanel
 from views.right_panel import RightPanel
-from PySide6.QtGui import QShortcut, QKeySequence
-from utils.setting import deliminator, response_prefix, n_history, search_delay, user_prefix, system_prefix
-from models.llm_client_worker import OpenAIWorker, AnthropicWorker, PerplexityWorker, LLMResults
+from views.output_area import OutputArea
+from views.render_cache import RenderCache
+from views.stats_dialog import StatsDialog
+from PySide6.QtGui import QShortcut, QKeySequence, QTextDocument
+from utils.setting import deliminator, response_prefix, n_history, search_delay, user_prefix, system_prefix, stream_render_interval, history_update_interval
+from utils.setting import render_cache_size, render_prefetch, outbox_retry_interval, outbox_write_timeout
+from models.llm_client_worker import Worker, LLMResults
 from models.api_client_manager import APIClientManager
+from models.async_engine import AsyncEngine
+from models.request_scheduler import RequestScheduler
 from models.config_manager import Config
 from PySide6.QtCore import QThreadPool
 import utils.messages as messages
-from models.database_manager import DatabaseManager
+import uuid
+from models.database_manager import DatabaseManager, HistorySummary
+from models.response_cache import ResponseCache
 
-from typing import List
+from typing import List, Dict, Set
 from PySide6.QtCore import QTimer
 from controllers.status_bar_controller import StatusBarController
+from controllers.session import Session
 
 class MainController:
-    def __init__(self, c_panel: CenterPanel, menu_bar:MenuBar, hist_panel:HistoryPanel,r_panel:RightPanel, clients: APIClientManager,db:DatabaseManager, config:Config,status_bar_controller:StatusBarController, logger) -> None:
+    def __init__(self, c_panel: CenterPanel, menu_bar:MenuBar, hist_panel:HistoryPanel,r_panel:RightPanel, clients: APIClientManager,db:DatabaseManager, cache:ResponseCache, config:Config,status_bar_controller:StatusBarController, logger) -> None:
         self.c_panel = c_panel
         self.r_panel = r_panel
         self.menu_bar = menu_bar
         self.hist_panel = hist_panel
         self.db = db
+        self.cache = cache # None when disabled in config.json
         
-        self.openai_clients = clients.openai_client
-        self.anthropic_clients = clients.anthropic_client
-        self.perplexity_clients = clients.perplexity_client
-
-        self.openai_models = config.openai_models
-        self.anthropic_models = config.anthropic_models
-        self.perplexity_models = config.perplexity_models
+        self.clients = clients
+        self.providers = clients.providers
+        self.stream = config.stream
+        self.timeouts = config.timeouts
 
         self.logger = logger
 
-        self.c_panel.input_panel.prompt_buttons_panel.prompt_selected.connect(self.insert_prompt)
         self.menu_bar.prompt_selected.connect(self.insert_prompt)
+        self.menu_bar.stats_signal.connect(self.show_stats)
 
+        # matches the size of the connection pools in APIClientManager
         self.threadpool = QThreadPool()
+        self.threadpool.setMaxThreadCount(config.max_concurrency)
+
+        # in-flight workers by request id; keeping them referenced until the result
+        # arrives stops their signals object from being collected before delivery
+        self.workers: Dict[str, Worker] = {}
+
+        # fan-out sends: batch id -> {request id: result (None until it arrives)}
+        self.batches: Dict[str, Dict[str, LLMResults]] = {}
+
+        # requests that couldn't connect, sent again every outbox_retry_interval or as soon as another one succeeds
+        self.offline: Dict[str, Worker] = {}
+        # requests dispatched but not sent yet, waiting for their outbox row
+        self.unsent: Set[str] = set()
+        self.offline_timer = QTimer()
+        self.offline_timer.setSingleShot(True)
+        self.offline_timer.setInterval(outbox_retry_interval * 1000)
+        self.offline_timer.timeout.connect(self.resume_offline_requests)
+
+        # requests run either on the thread pool or on the asyncio engine (config "engine")
+        self.engine = None
+        if config.engine == "asyncio":
+            self.engine = AsyncEngine(clients, logger)
+        elif config.engine != "threadpool":
+            self.logger.warning(f"Unknown engine '{config.engine}', using threadpool")
+
+        # admission control (per-provider rate limits) and retries in front of the engine
+        self.scheduler = RequestScheduler(config.rate_limits, config.retry, self.start_worker, logger, self.providers.concurrency_limits())
 
         # send button
         self.r_panel.action_buttons_panel.send_signal.connect(self.handle_send)
 
         # append button
         self.r_panel.action_buttons_panel.append_signal.connect(self.handle_append)
+
+        # cancel button
+        self.r_panel.action_buttons_panel.cancel_signal.connect(self.cancel_session)
         
-        # list of the table items for the history panel (database id)
-        self.table_items: List[int] = []
-        self.current_item = None
+        # rows of the history panel
+        self.history_model = self.hist_panel.model
+        # history items ready to show; the rows after the selected one (in the direction of travel) are rendered ahead
+        self.render_cache = RenderCache(render_cache_size)
+        self.history_row = None
+        self.history_direction = 1
+        self.prefetch_timer = QTimer()
+        self.prefetch_timer.setSingleShot(True)
+        self.prefetch_timer.timeout.connect(self.prefetch_history_items)
+
+        # the sessions (tabs of the center panel), and the session each request in flight was sent from
+        self.sessions: Dict[SessionPanel, Session] = {}
+        self.request_sessions: Dict[str, Session] = {}
+        self.active_session = None
+        for panel in self.c_panel.sessions():
+            self.add_session(panel)
+        self.active_session = self.session
+        self.c_panel.session_added.connect(self.add_session)
+        self.c_panel.tabs.currentChanged.connect(self.switch_session)
+        self.c_panel.tabs.tabCloseRequested.connect(lambda index: self.close_session(self.c_panel.tabs.widget(index)))
 
         # style switch
         self.style = True
         self.r_panel.style_switch.stateChanged.connect(self.update_style_mode)
 
-        # history panel
-        self.populate_table_from_db(n_history)
-        self.hist_panel.table_widget.cellClicked.connect(self.on_table_item_clicked)
-        self.hist_panel.table_widget.itemSelectionChanged.connect(lambda: self.on_table_item_selected(self.hist_panel.table_widget.currentRow(), 0))
+        # history panel (filled by app.py once the window is shown)
+        table_view = self.hist_panel.table_view
+        table_view.clicked.connect(lambda index: self.on_table_item_clicked(index.row(), index.column()))
+        table_view.selectionModel().selectionChanged.connect(lambda: self.on_table_item_selected(table_view.currentIndex().row(), 0))
+        self.history_model.more_requested.connect(self.load_more_history)
+
 
+        # streaming: chunks are buffered per request and flushed to their output area at a fixed rate
+        self.stream_targets: Dict[str, OutputArea] = {}
+        self.stream_buffers: Dict[str, List[str]] = {}
+        self.stream_started: Set[str] = set()
+        self.stream_timer = QTimer()
+        self.stream_timer.setInterval(stream_render_interval)
+        self.stream_timer.timeout.connect(self.flush_stream_buffer)
 
         self.search_timer = QTimer()
         self.search_timer.setSingleShot(True)
         self.search_timer.timeout.connect(self.hist_panel_search)
         self.hist_panel.search_box.textChanged.connect(lambda: self.search_timer.start(search_delay))
 
+        # rows written within history_update_interval are added to the history list together
+        self.written_ids: List[int] = []
+        self.history_update_timer = QTimer()
+        self.history_update_timer.setSingleShot(True)
+        self.history_update_timer.setInterval(history_update_interval)
+        self.history_update_timer.timeout.connect(self.add_written_rows)
+
         self.setup_shortcuts()
 
         self.status_bar_controller = status_bar_controller
 
         self.c_panel.input_panel.set_focus()
 
-        self.all_models = {**self.openai_models, **self.anthropic_models, **self.perplexity_models}
+    @property
+    def session(self) -> Session:
+        """The session of the current tab."""
+        return self.sessions[self.c_panel.current_session()]
+
+    def add_session(self, panel:SessionPanel):
+        self.sessions[panel] = Session(panel, self.logger)
+        panel.input_panel.prompt_buttons_panel.prompt_selected.connect(self.insert_prompt)
+
+    def switch_session(self, index:int):
+        session = self.sessions.get(self.c_panel.tabs.widget(index))
+        if session is None or session is self.active_session:
+            return
+
+        # the model selection goes with the session
+        if self.active_session is not None:
+            self.active_session.selection = self.r_panel.model_selection_panel.selection()
+        self.active_session = session
+        if session.selection is not None:
+            self.r_panel.model_selection_panel.set_selection(session.selection)
+
+    def close_session(self, panel:SessionPanel):
+        session = self.sessions.get(panel)
+        if session is None:
+            return
+
+        # the last tab is cleared instead
+        if len(self.sessions) == 1:
+            self.shortcut_Ctrl_0()
+            return
+
+        # its requests still running are stored in the history when done, but shown nowhere
+        for request_id in [r for r, s in self.request_sessions.items() if s is session]:
+            del self.request_sessions[request_id]
+            self.stop_stream(request_id)
+        del self.sessions[panel]
+        if self.active_session is session:
+            self.active_session = None
+        self.c_panel.close_session(panel)
 
     def update_style_mode(self):
         self.style = self.r_panel.style_switch.isChecked()
 
-        if self.current_item is not None:
-            current_result = self.db.get_one_item(self.current_item)
-            output_str = current_result.response if current_result else ""
-
-            self.c_panel.output_area.set_text(output_str, self.style)
+        for session in self.sessions.values():
+            session.panel.compare_panel.restyle(self.style)
+            if session.current_item is None:
+                continue
+            entry = self.history_item(session.current_item)
+            if entry is not None:
+                self.show_response(session, entry[0].response, entry[1], self.history_rendered(session.current_item, self.style))
+            else:
+                session.panel.output_area.set_text("", self.style)
+        self.prefetch_timer.start()
 
     def insert_prompt(self, prompt_text):
         self.c_panel.input_panel.clear_text()
@@ -91,13 +206,14 @@ class MainController:
         self.c_panel.input_panel.textarea.append_text(user_prefix)
 
     def handle_append(self):
-        self.logger.debug(f"append button, current_item: {self.current_item}")
+        current_item = self.session.current_item
+        self.logger.debug(f"append button, current_item: {current_item}")
 
-        if self.current_item is None:
+        if current_item is None:
             self.logger.warning("No current item selected.")
             return
 
-        item = self.db.get_one_item(self.current_item)
+        item = self.db.get_one_item(current_item)
         original_prompt = item.prompt
         response_txt = item.response
 
@@ -107,129 +223,489 @@ class MainController:
         
         self.c_panel.input_panel.set_focus()
 
-    def handle_send(self):
-        self.current_item = None
+    def create_worker(self, session:Session, prompt:str, model_selected:str, temperature:int) -> Worker:
+        worker = self.providers.create_worker(self.clients, prompt, model_selected, temperature, self.logger, self.stream)
+        if worker is not None:
+            # only the text added since the session's previous send is parsed
+            worker.chat = session.chat_parser.parse(prompt, worker.allow_system)
+        return worker
+
+    def dispatch(self, session:Session, worker:Worker, on_result, use_cache:bool=True):
+        """session: None to only store the result in the history."""
+        self.status_bar_controller.increment_threads()
+        worker.signals.result.connect(on_result)
+        worker.signals.offline.connect(self.request_offline)
+        self.workers[worker.request_id] = worker
+        self.request_sessions[worker.request_id] = session
+
+        # sent once written to the outbox, so that it is sent again if the app stops before the result is stored;
+        # sent anyway if the write fails or doesn't finish in time
+        self.unsent.add(worker.request_id)
+        self.db.add_request(worker.request_id, worker.batch_id, worker.prompt, worker.model_key, worker.temp, lambda written: self.send(worker, written, use_cache))
+        QTimer.singleShot(outbox_write_timeout * 1000, lambda: self.send(worker, None, use_cache))
+
+    def send(self, worker:Worker, written:bool, use_cache:bool=True):
+        """written: None if the outbox row couldn't be written (in time)."""
+        if worker.request_id not in self.unsent:
+            return
+        self.unsent.discard(worker.request_id)
+        if written is None:
+            self.logger.warning(f"{worker.model_key}: outbox row missing (write failed or timed out), sending the request anyway; it won't be sent again after a restart")
+        if worker.cancelled:
+            # answered while it was being written
+            return
+
+        if self.serve_from_cache(worker, use_cache):
+            return
+
+        if self.stream:
+            worker.signals.chunk.connect(self.on_stream_chunk)
+
+        self.scheduler.submit(worker)
+
+    def start_worker(self, worker:Worker):
+        if worker.attempt == 0:
+            self.db.set_request_status(worker.request_id, "in_flight")
+            # the total timeout covers retries too, but not the wait in the rate limit queue or for the connection
+            total = self.timeouts.get(worker.provider, {}).get("total")
+            if total:
+                message = messages.timeout_message.format(total)
+                resumed = worker.resumed
+                QTimer.singleShot(int(total * 1000), lambda: self.request_timed_out(worker, resumed, message))
+
+        if self.engine is not None:
+            self.engine.start(worker)
+        else:
+            # started as a callable, so the same worker can run again for a retry
+            self.threadpool.start(worker.run)
+
+    def request_timed_out(self, worker:Worker, resumed:int, message:str):
+        # not since waiting for the connection: sending it again started a new timeout
+        if worker.resumed == resumed and worker.request_id not in self.offline:
+            self.cancel_request(worker.request_id, message)
+
+    def request_offline(self, request_id:str):
+        """A request couldn't connect: it waits in the outbox, pending, until resume_offline_requests()."""
+        worker = self.workers.get(request_id)
+        if worker is None or worker.cancelled:
+            return
+
+        self.scheduler.finished(worker)
+        self.offline[request_id] = worker
+        self.db.set_request_status(request_id, "pending")
+        target = self.stream_targets.get(request_id)
+        if target is not None:
+            target.text_edit.setHtml(messages.offline_message)
+        self.status_bar_controller.update_offline(len(self.offline))
+        if not self.offline_timer.isActive():
+            self.offline_timer.start()
+
+    def resume_offline_requests(self):
+        workers, self.offline = list(self.offline.values()), {}
+        if workers:
+            self.logger.info(f"Sending {len(workers)} request(s) waiting for the connection again")
+        for worker in workers:
+            worker.attempt = 0
+            worker.resumed += 1
+            self.scheduler.enqueue(worker)
+        self.offline_timer.stop()
+        self.status_bar_controller.update_offline(0)
+
+    def resume_outbox(self):
+        """Send the requests left unanswered when the app last stopped again; their results are only stored in the history."""
+        requests = self.db.get_open_requests()
+        if requests:
+            self.logger.info(f"Sending {len(requests)} unanswered request(s) from the outbox again")
+        for request in requests:
+            worker = self.providers.create_worker(self.clients, request.prompt, request.model, request.temperature, self.logger, self.stream)
+            if worker is None:
+                # the model was removed from config.json
+                self.db.set_request_status(request.request_id, "failed")
+                continue
+            worker.request_id = request.request_id
+            worker.batch_id = request.batch_id
+            self.dispatch(None, worker, self.update_output)
+
+    def cancel_request(self, request_id:str, reason:str=messages.cancel_message):
+        """
+        Cancel an in-flight request and answer it right away with `reason`;
+        whatever the worker returns afterwards is ignored.
+        """
+        worker = self.workers.get(request_id)
+        if worker is None:
+            return
+
+        self.logger.warning(f"{worker.model_key}: {reason}")
+        if self.offline.pop(request_id, None) is not None:
+            self.status_bar_controller.update_offline(len(self.offline))
+        self.scheduler.cancel(worker)
+        worker.cancel()
+        worker.error = True
+        worker.emit_result(worker.parse_chat(), reason)
+
+    def cancel_session(self):
+        """Cancel the requests sent from the current session."""
+        session = self.session
+        for request_id in [r for r, s in self.request_sessions.items() if s is session]:
+            self.cancel_request(request_id)
+
+    def serve_from_cache(self, worker:Worker, use_cache:bool) -> bool:
+        """
+        Answer the worker's request from the response cache if possible.
+
+        The cache key is computed even when bypassing the cache, so that the
+        fresh response replaces the cached one.
+        """
+        if self.cache is None:
+            return False
+
+        chat = worker.parse_chat()
+        worker.cache_key = self.cache.make_key(chat, worker.provider, worker.model_val, worker.temp)
+        if not use_cache:
+            return False
+
+        response = self.cache.get(worker.cache_key)
+        self.status_bar_controller.update_cache_stats(self.cache.hits, self.cache.misses)
+        if response is None:
+            return False
+
+        self.logger.info(f"Cache hit: {worker.model_key}")
+        worker.cached = True
+        worker.emit_result(chat, response)
+        return True
+
+    def store_in_cache(self, result:LLMResults, worker:Worker):
+        if self.cache is None or worker is None or worker.cache_key is None:
+            return
+        if result.cached or result.error:
+            return
+        self.cache.put(worker.cache_key, result.model, result.response)
+
+    def handle_send_without_cache(self):
+        self.handle_send(use_cache=False)
+
+    def handle_send(self, use_cache:bool=True):
         prompt = self.c_panel.input_panel.get_text()
-        model_selected = self.r_panel.model_selection_panel.model_group.checkedButton().text()
-        model_real = self.all_models[model_selected]
-        temperature = self.r_panel.model_selection_panel.temperature_slider.value()
+        model_panel = self.r_panel.model_selection_panel
+        models_selected = model_panel.selected_models()
+        temperature = model_panel.temperature_slider.value()
 
         if not prompt:
             self.logger.warning("No prompt to send.")
             return
-        
-        self.c_panel.output_area.clear()
-        self.c_panel.output_area.text_edit.setHtml(messages.loading_message)
-
-        if model_selected in self.openai_models.keys():
-            self.status_bar_controller.increment_threads()
-            worker = OpenAIWorker(
-                prompt,
-                model_selected,
-                model_real,
-                self.openai_clients,
-                temperature,
-                self.logger
-                )
-        elif model_selected in self.anthropic_models.keys():
-            self.status_bar_controller.increment_threads()
-            worker = AnthropicWorker(
-                prompt,
-                model_selected,
-                model_real,
-                self.anthropic_clients,
-                temperature,
-                self.logger
-                )
-
-        elif model_selected in self.perplexity_models.keys():
-            self.logger.info("Perplexity model selected")
-            self.status_bar_controller.increment_threads()
-            worker = PerplexityWorker(
-                prompt,
-                model_selected,
-                model_real,
-                self.perplexity_clients,
-                temperature,
-                self.logger
-                )
-        else:
-            self.logger.error(f"Model not found: {model_selected}")
+
+        if not models_selected:
+            self.logger.warning("No model selected.")
+            return
+
+        if model_panel.compare_mode() and len(models_selected) > 1:
+            self.handle_send_batch(prompt, models_selected, temperature, use_cache)
+            return
+
+        session = self.session
+        session.current_item = None
+        session.pending_item = None
+        worker = self.create_worker(session, prompt, models_selected[0], temperature)
+        if worker is None:
+            return
+
+        session.panel.show_output_area()
+        session.panel.output_area.clear()
+        session.panel.output_area.text_edit.setHtml(messages.loading_message)
+
+        self.start_stream(session, worker.request_id, session.panel.output_area)
+        self.dispatch(session, worker, self.update_output, use_cache)
+
+    def handle_send_batch(self, prompt:str, models_selected:List[str], temperature:int, use_cache:bool=True):
+        """
+        Fan the prompt out to several models concurrently. Each response is shown
+        in its own pane as it arrives; all of them are stored together at the end.
+        """
+        session = self.session
+        session.current_item = None
+        session.pending_item = None
+        batch_id = uuid.uuid4().hex
+
+        workers = []
+        for model_selected in models_selected:
+            worker = self.create_worker(session, prompt, model_selected, temperature)
+            if worker is not None:
+                worker.batch_id = batch_id
+                workers.append(worker)
+
+        if not workers:
             return
-        
-        worker.signals.result.connect(self.update_output)
-        self.threadpool.start(worker)
+
+        self.logger.info(f"Batch {batch_id}: sending to {[w.model_key for w in workers]}")
+        session.panel.show_compare_panel([(w.request_id, w.model_key) for w in workers])
+        self.batches[batch_id] = {w.request_id: None for w in workers}
+
+        self.stop_session_streams(session)
+        for worker in workers:
+            self.start_stream(session, worker.request_id, session.panel.compare_panel.pane(worker.request_id), exclusive=False)
+            self.dispatch(session, worker, self.update_batch_output, use_cache)
+
+    def start_stream(self, session:Session, request_id:str, target:OutputArea, exclusive:bool=True):
+        # a single send renders only the most recent request of its session live
+        if exclusive:
+            self.stop_session_streams(session)
+        self.stream_targets[request_id] = target
+        self.stream_buffers[request_id] = []
+
+    def on_stream_chunk(self, request_id:str, text:str):
+        if request_id not in self.stream_targets:
+            return
+
+        self.stream_buffers[request_id].append(text)
+        if not self.stream_timer.isActive():
+            self.stream_timer.start()
+
+    def flush_stream_buffer(self):
+        flushed = False
+        for request_id, buffer in self.stream_buffers.items():
+            if not buffer:
+                continue
+
+            target = self.stream_targets[request_id]
+            if request_id not in self.stream_started:
+                # replace the loading message with the first chunk
+                target.clear()
+                self.stream_started.add(request_id)
+
+            target.append_text("".join(buffer))
+            buffer.clear()
+            flushed = True
+
+        if not flushed:
+            self.stream_timer.stop()
+
+    def stop_stream(self, request_id:str=None):
+        if request_id is not None:
+            self.stream_targets.pop(request_id, None)
+            self.stream_buffers.pop(request_id, None)
+            self.stream_started.discard(request_id)
+            return
+
+        self.stream_timer.stop()
+        self.stream_targets = {}
+        self.stream_buffers = {}
+        self.stream_started = set()
+
+    def stop_session_streams(self, session:Session):
+        for request_id in [r for r in self.stream_targets if self.request_sessions.get(r) is session]:
+            self.stop_stream(request_id)
 
     def update_output(self, result_dict:dict):
-        self.status_bar_controller.decrement_threads()
         result = LLMResults(**result_dict)
+        worker = self.workers.pop(result.request_id, None)
+        if worker is None:
+            # late result of a request that was already cancelled
+            return
+        self.scheduler.finished(worker)
+        self.status_bar_controller.decrement_threads()
         self.logger.debug(result)
+        self.store_in_cache(result, worker)
+        self.logger.debug(f"Connection pools: {self.clients.pool_summary()}")
+        self.resume_if_online(result)
+
+        request_id = result.request_id
+        session = self.request_sessions.pop(request_id, None)
+        if session is None:
+            # resumed from the outbox, or its session was closed: only stored
+            self.db.insert_history(result, self.history_rows_written)
+            return
 
-        self.db.insert_history(result)
-
-        result = self.db.get_latest_item()
-        self.current_item = result.id
-
-        self.hist_panel.table_widget.clearContents()
-        self.hist_panel.table_widget.setRowCount(0)
-        self.populate_table_from_db(n_history)
-        self.set_llm_results(result_dict)
-        self.c_panel.input_panel.set_focus()
+        # any finished result takes over its session's output area, which ends the live stream there
+        self.stop_stream(request_id)
+        self.stop_session_streams(session)
+
+        # written by the database thread; the id becomes the current item once known
+        session.current_item = None
+        session.pending_item = request_id
+        self.db.insert_history(result, lambda ids: self.history_written(session, request_id, ids))
+
+        if worker.followup is not None:
+            # the input area now shows the prompt as stored, which the worker has already parsed
+            session.chat_parser.prefixes[worker.allow_system] = worker.followup
+
+        self.set_llm_results(result_dict, session=session)
+        if session is self.session:
+            session.panel.input_panel.set_focus()
+
+    def resume_if_online(self, result:LLMResults):
+        # the connection is back: the requests waiting for it go now
+        if self.offline and not result.error and not result.cached:
+            self.resume_offline_requests()
+
+    def history_written(self, session:Session, request_id:str, ids:List[int]):
+        if ids and session.pending_item == request_id:
+            # the response is still the one shown
+            session.current_item = ids[0]
+            session.pending_item = None
+        self.history_rows_written(ids)
+
+    def history_rows_written(self, ids:List[int]):
+        if ids:
+            self.written_ids.extend(ids)
+            # not restarted: the first row of a burst waits at most one interval
+            if not self.history_update_timer.isActive():
+                self.history_update_timer.start()
+
+    def add_written_rows(self):
+        ids, self.written_ids = self.written_ids, []
+        search_text = self.hist_panel.search_box.text()
+        if search_text:
+            # search results: the new rows that match, on top
+            self.history_model.insert_items(self.db.search(search_text, ids), at_top=True)
+        else:
+            self.history_model.insert_items(self.db.get_summaries(ids))
 
-    def set_llm_results(self, result:dict):
-        result = LLMResults(**result)
+    def update_batch_output(self, result_dict:dict):
+        result = LLMResults(**result_dict)
+        worker = self.workers.pop(result.request_id, None)
+        if worker is None:
+            # late result of a request that was already cancelled
+            return
+        self.scheduler.finished(worker)
+        self.status_bar_controller.decrement_threads()
+        self.logger.debug(result)
+        self.store_in_cache(result, worker)
+        self.resume_if_online(result)
+
+        self.stop_stream(result.request_id)
+        session = self.request_sessions.pop(result.request_id, None)
+        # None if its session was closed; the batch is still stored
+        if session is not None:
+            session.panel.compare_panel.set_result(result.request_id, result.response, self.style)
+
+        batch = self.batches.get(result.batch_id)
+        if batch is None:
+            self.logger.error(f"Unknown batch: {result.batch_id}")
+            return
 
-        currrent_txt = self.c_panel.input_panel.get_text()
+        batch[result.request_id] = result
+        if any(r is None for r in batch.values()):
+            return
 
+        # all models answered: store them together, in the order they were sent
+        del self.batches[result.batch_id]
+        self.db.insert_history_batch(list(batch.values()), self.history_rows_written)
+        self.logger.info(f"Batch {result.batch_id} completed")
 
-        self.c_panel.input_panel.clear_text()
-        self.c_panel.input_panel.set_text(result.prompt)
-        self.r_panel.model_selection_panel.set_selected_model(result.model)
-        self.c_panel.output_area.set_text(result.response, self.style)
-        self.r_panel.set_temperature(result.temperature)
+    def set_llm_results(self, result:dict, rendered=None, done=None, session:Session=None):
+        """Show a result in a session, the current one by default; see show_response() for rendered and done."""
+        session = session or self.session
+        result = LLMResults(**result)
+        session.panel.show_output_area()
+
+        session.panel.input_panel.clear_text()
+        session.panel.input_panel.set_text(result.prompt)
+        if session is self.session:
+            self.r_panel.model_selection_panel.set_selected_model(result.model)
+            self.r_panel.set_temperature(result.temperature)
+        elif session.selection is not None:
+            # shown by the right panel when the session's tab is
+            models, compare, temperature = session.selection
+            session.selection = (models if compare else [result.model], compare, temperature if result.temperature is None else result.temperature)
+        self.show_response(session, result.response, rendered, done)
+
+    def show_response(self, session:Session, response:str, rendered=None, done=None):
+        """
+        rendered: the response from OutputArea.render(), None to render it here;
+        done(document) then, if it is shown in chunks (see OutputArea.set_text()).
+        """
+        # a document is laid out for one text edit: not shown by two sessions at once
+        if isinstance(rendered, QTextDocument) and any(s.panel.output_area.rendered is rendered for s in self.sessions.values() if s is not session):
+            rendered, done = None, None
+
+        if rendered is None:
+            session.panel.output_area.set_text(response, self.style, done)
+        else:
+            session.panel.output_area.show_rendered(rendered)
 
     def populate_table_from_db(self, num_history):
-        items:List[LLMResults] = self.db.get_n_history(num_history)
-        self.populate_table(items)
+        items:List[HistorySummary] = self.db.get_history_page(num_history)
+        self.populate_table(items, more=len(items) == num_history)
 
-    def populate_table(self, items:List[LLMResults]):
-        self.hist_panel.table_widget.clearContents()
-        self.hist_panel.table_widget.setRowCount(len(items))
-        self.table_items = []
-
-        for row, item in enumerate(items):
-            self.hist_panel.set_one_row_to_table(row, item)
-            self.table_items.append(item.id)
+    def load_more_history(self, after):
+        items:List[HistorySummary] = self.db.get_history_page(n_history, after)
+        self.history_model.append_items(items, more=len(items) == n_history)
 
+    def populate_table(self, items:List[HistorySummary], more:bool = False):
+        self.history_model.set_items(items, more)
 
     def on_delete_label_clicked(self, id):
         self.logger.info(f"Delete item with id: {id}")
-        self.db.delete_history(id)
-        self.table_items.remove(id)
-        self.hist_panel.table_widget.clearContents()
-        self.hist_panel.table_widget.setRowCount(0)
-        self.populate_table_from_db(n_history)
+        self.db.delete_history(id, self.history_row_deleted)
+
+    def history_row_deleted(self, id):
+        # None if the delete failed
+        if id is not None:
+            self.history_model.remove_ids([id])
+            self.render_cache.discard(id)
 
     def on_table_item_clicked(self, row, column):
-        id = self.table_items[row]
-        item = self.db.get_one_item(id)
+        if row < 0:
+            return
+        id = self.history_model.item(row).id
 
         if column == 3:
             self.on_delete_label_clicked(id)
             return
 
-        if item:
-            self.current_item = id
+        entry = self.history_item(id)
+        if entry:
+            item, rendered = entry
+            if self.history_row is not None and row != self.history_row:
+                self.history_direction = 1 if row > self.history_row else -1
+            self.history_row = row
+            self.session.current_item = id
+            self.session.pending_item = None
             self.set_llm_results({
                 "prompt": item.prompt,
                 "response": item.response,
                 "model": item.model,
                 'datetime': item.datetime,
                 'temperature': item.temperature
-            })
+            }, rendered, self.history_rendered(id, self.style))
+            self.prefetch_timer.start()
         else:
             self.logger.error(f"Item not found: {id}")
 
+    def history_item(self, id:int):
+        """(LLMResults, rendered response) of a history item in the current style, None if not found."""
+        entry = self.render_cache.get(id, self.style)
+        if entry is None:
+            item = self.db.get_one_item(id)
+            if item is None:
+                return None
+            entry = self.render_cache.put(id, self.style, item, self.c_panel.output_area.render(item.response, self.style))
+        return entry
+
+    def history_rendered(self, id:int, style:bool):
+        """done() for OutputArea.set_text(): cache the document of a long response once shown in chunks."""
+        def done(document):
+            entry = self.render_cache.get(id, style)
+            # not if deleted or evicted meanwhile
+            if entry is not None:
+                self.render_cache.put(id, style, entry[0], document)
+        return done
+
+    def prefetch_history_items(self):
+        """Render the next uncached row ahead of the selected one; one per call, so that key presses go first."""
+        row = self.hist_panel.table_view.currentIndex().row()
+        if row < 0:
+            return
+        for step in range(1, render_prefetch + 1):
+            ahead = row + step * self.history_direction
+            if not 0 <= ahead < self.history_model.rowCount():
+                return
+            id = self.history_model.item(ahead).id
+            if self.render_cache.get(id, self.style) is None:
+                self.history_item(id)
+                self.prefetch_timer.start()
+                return
+
 
     def on_table_item_selected(self, row, column):
         self.on_table_item_clicked(row, 0)
@@ -238,11 +714,21 @@ class MainController:
         search_text = self.hist_panel.search_box.text()
         self.logger.debug(f"perform_search, search_text: {search_text}")
         if search_text:
-            search_results = self.db.search(search_text)
-            self.populate_table(search_results)
+            self.db.search_async(search_text, self.show_search_results)
         else:
+            self.db.cancel_search()
             self.populate_table_from_db(n_history)
 
+    def show_search_results(self, search_text:str, search_results:List[HistorySummary]):
+        # the text may have changed while the search was running
+        if search_text != self.hist_panel.search_box.text():
+            return
+        self.populate_table(search_results)
+
+
+    def show_stats(self):
+        dialog = StatsDialog(self.db.get_model_stats(), self.c_panel)
+        dialog.exec()
 
     def setup_shortcuts(self):
 
@@ -253,11 +739,11 @@ class MainController:
 
         # Ctrl + D, for history table widget
         self.history_shortcut = QShortcut(QKeySequence("Ctrl+d"), self.c_panel)
-        self.history_shortcut.activated.connect(self.hist_panel.table_widget.setFocus)
+        self.history_shortcut.activated.connect(self.hist_panel.table_view.setFocus)
 
         # Ctrl + L, for focusing on the input panel
         self.input_shortcut = QShortcut(QKeySequence("Ctrl+l"), self.c_panel)
-        self.input_shortcut.activated.connect(self.c_panel.input_panel.set_focus)
+        self.input_shortcut.activated.connect(lambda: self.c_panel.input_panel.set_focus())
 
         # Ctrl + 0, for resetting the input panel and output panel
         self.reset_shortcut = QShortcut(QKeySequence("Ctrl+0"), self.c_panel)
@@ -271,8 +757,31 @@ class MainController:
         self.send_shortcut = QShortcut(QKeySequence("Ctrl+Return"), self.c_panel)
         self.send_shortcut.activated.connect(self.handle_send)
 
+        # Ctrl + Shift + Return, for sending the prompt without using the response cache
+        self.send_no_cache_shortcut = QShortcut(QKeySequence("Ctrl+Shift+Return"), self.c_panel)
+        self.send_no_cache_shortcut.activated.connect(self.handle_send_without_cache)
+
+        # Esc, for cancelling the requests in flight of the current session
+        self.cancel_shortcut = QShortcut(QKeySequence("Esc"), self.c_panel)
+        self.cancel_shortcut.activated.connect(self.cancel_session)
+
+        # Ctrl + T / Ctrl + W, for opening a new session and closing the current one
+        self.new_session_shortcut = QShortcut(QKeySequence("Ctrl+t"), self.c_panel)
+        self.new_session_shortcut.activated.connect(self.c_panel.new_session)
+        self.close_session_shortcut = QShortcut(QKeySequence("Ctrl+w"), self.c_panel)
+        self.close_session_shortcut.activated.connect(lambda: self.close_session(self.c_panel.current_session()))
+
+    def close(self):
+        if self.engine is not None:
+            self.engine.close()
+        if self.cache is not None:
+            self.cache.close()
+        # waits for the queued history writes
+        self.db.close()
+
     def shortcut_Ctrl_0(self):
         self.c_panel.clear_textboxes()
-        self.current_item = None
+        self.session.current_item = None
+        self.session.pending_item = None
         self.c_panel.input_panel.set_focus()
         
\ No newline at end of file
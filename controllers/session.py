@@ -0,0 +1,17 @@
+from views.session_panel import SessionPanel
+from models.chat_parser import ChatParser
+
+class Session:
+    """
+    What the controller keeps per tab of the center panel: requests are
+    answered in the session they were sent from, whichever tab is shown.
+    """
+    def __init__(self, panel:SessionPanel, logger):
+        self.panel = panel
+        # the history item shown, or the request_id of a response whose history row is being written
+        self.current_item = None
+        self.pending_item = None
+        # the conversation, parsed incrementally: a send only parses the text added since the last one
+        self.chat_parser = ChatParser(logger, incremental=True)
+        # the right panel's model selection while another session is shown (see ModelSelectionPanel.selection())
+        self.selection = None
@@ -2,16 +2,31 @@ class StatusBarController:
     def __init__(self, main_window, logger):
         self.status_bar = main_window.statusBar()
         self.n_threads = 0
+        self.cache_message = ""
+        self.offline_message = ""
         self.status_bar.showMessage("Ready")
         self.logger = logger
 
     def update_status(self):
         if self.n_threads == 0:
-            self.status_bar.showMessage("Ready")
+            message = "Ready"
 
         else:
             message = f"Waiting for {self.n_threads} response(s)..."
-            self.status_bar.showMessage(message)
+
+        if self.offline_message:
+            message = f"{message}    {self.offline_message}"
+        if self.cache_message:
+            message = f"{message}    {self.cache_message}"
+        self.status_bar.showMessage(message)
+
+    def update_cache_stats(self, hits, misses):
+        self.cache_message = f"Cache: {hits} hit(s), {misses} miss(es)"
+        self.update_status()
+
+    def update_offline(self, n_waiting):
+        self.offline_message = f"Offline: {n_waiting} request(s) queued" if n_waiting else ""
+        self.update_status()
 
     def increment_threads(self):
         self.n_threads += 1
@@ -1,53 +1,279 @@
 import os
-from openai import OpenAI
-from anthropic import Anthropic
+import sys
+import time
+import threading
+import importlib
+import importlib.util
 from logging import Logger
-import requests
+from typing import TYPE_CHECKING
+from models.llm_client_worker import current_worker
+from models.provider_registry import ProviderRegistry, Provider
+
+# the SDKs take most of the startup time, so they are imported on first use (or by preload())
+if TYPE_CHECKING:
+    import httpx
+
+# provider type -> module its client needs
+sdk_modules = {
+    "openai": "openai",
+    "anthropic": "anthropic",
+    "perplexity": "httpx",
+}
 
 class Perplexity_client:
-    def __init__(self, api_key):
+    def __init__(self, api_key, http_client=None):
         self.api_key = api_key
+        self.http_client = http_client
+
+def note_network_stream(event_name, info):
+    """
+    httpx trace callback: keep the connection the current worker's request is
+    sent on, so that Worker.cancel() can shut it down while the request still
+    waits for the response headers (before that there's no response to close).
+
+    A new connection comes with its stream. A keep-alive one is taken from the
+    HTTP/1.1 connection sending the request, which is tracing this event.
+    HTTP/2 connections are shared by several requests and are left open.
+    """
+    worker = current_worker.get()
+    if worker is None:
+        return
+    if event_name in ("connection.connect_tcp.complete", "connection.start_tls.complete"):
+        worker.network_stream = info.get("return_value")
+    elif event_name == "http2.send_request_headers.started":
+        worker.network_stream = None
+    elif event_name == "http11.send_request_headers.started":
+        frame = sys._getframe(1)
+        while frame is not None:
+            network_stream = getattr(frame.f_locals.get("self"), "_network_stream", None)
+            if network_stream is not None:
+                worker.network_stream = network_stream
+                break
+            frame = frame.f_back
+
+class PoolStats:
+    """
+    Connection pool counters for one provider.
+
+    A request that opens a new TCP connection is a miss, any other request
+    reused a keep-alive connection from the pool and is a hit.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.misses = 0
+
+    @property
+    def hits(self):
+        return self.requests - self.misses
+
+    def on_request(self, request: "httpx.Request"):
+        with self.lock:
+            self.requests += 1
+        request.extensions["trace"] = self.trace
+
+    def trace(self, event_name, info):
+        if event_name == "connection.connect_tcp.complete":
+            with self.lock:
+                self.misses += 1
+        note_network_stream(event_name, info)
+
+    # async clients await their hooks and trace callbacks
+    async def on_request_async(self, request: "httpx.Request"):
+        self.on_request(request)
+        request.extensions["trace"] = self.trace_async
+
+    async def trace_async(self, event_name, info):
+        self.trace(event_name, info)
+
+    def __str__(self):
+        return f"{self.requests} requests, {self.hits} hits, {self.misses} misses"
 
 class APIClientManager:
-    def __init__(self, logger: Logger) -> None:
-        self.openai_client = None
-        self.anthropic_client = None
-        self.perplexity_client = None
+    """
+    Clients of the providers in the registry, created on first use.
+
+    Providers whose models are never sent to don't construct a client (or a pool).
+    """
+    def __init__(self, logger: Logger, providers: ProviderRegistry, max_connections: int = 8, timeouts: dict = None) -> None:
         self.logger = logger
+        self.providers = providers
+        self.clients = {}
+        self.lock = threading.Lock()
 
-        self.get_openai_client()
-        self.get_anthropic_client()
-        self.get_perplexity_client()
+        # one keep-alive pool per provider, shared by all workers
+        self.max_connections = max_connections
+        self.timeouts = timeouts or {}
+        self.http2 = importlib.util.find_spec("h2") is not None
+        self.http_clients = {}
+        self.pool_stats = {}
 
-    def get_openai_client(self):
-        try:
-            self.openai_client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
-            self.logger.info(f"OpenAI client initialized")
-        except KeyError as e:
-            self.logger.error(f"API Key Error (OpenAI): {e}")
-        except Exception as e:
-            self.logger.error(f"Error (OpenAI): {e}")
+        # clients for the AsyncEngine, created on first use in its event loop
+        self.async_clients = {}
+        self.async_http_clients = {}
+
+    def timeout(self, provider: str) -> "httpx.Timeout":
+        import httpx
+        # the total timeout is enforced by the controller, which cancels the request
+        timeouts = self.timeouts.get(provider, {})
+        return httpx.Timeout(timeouts.get("read", 600), connect=timeouts.get("connect", 5.0))
+
+    def on_response(self, response: "httpx.Response"):
+        # lets Worker.cancel() close the response the worker is waiting on,
+        # and times the first byte of requests that aren't streamed
+        worker = current_worker.get()
+        if worker is not None:
+            worker.response = response
+            if not worker.stream:
+                worker.mark_first_byte()
+
+    async def on_response_async(self, response: "httpx.Response"):
+        self.on_response(response)
+
+    def create_http_client(self, provider: str, client_class=None, is_async=False, **kwargs) -> "httpx.Client":
+        # the SDKs pass their own httpx flavour (DefaultHttpxClient) so their defaults are kept
+        import httpx
+        if client_class is None:
+            client_class = httpx.AsyncClient if is_async else httpx.Client
+        stats = self.pool_stats.setdefault(provider, PoolStats())
+        max_connections = self.providers.get(provider).max_concurrency or self.max_connections
+        http_client = client_class(
+            **kwargs,
+            http2=self.http2,
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+            ),
+            event_hooks={
+                "request": [stats.on_request_async if is_async else stats.on_request],
+                "response": [self.on_response_async if is_async else self.on_response],
+            },
+        )
+        if is_async:
+            self.async_http_clients[provider] = http_client
+        else:
+            self.http_clients[provider] = http_client
+        self.logger.debug(f"HTTP pool for {provider}: {max_connections} connections, http2={self.http2}, async={is_async}")
+        return http_client
+
+    def api_key(self, provider: Provider) -> str:
+        api_key = os.environ.get(provider.api_key_env) if provider.api_key_env else None
+        if api_key is None and provider.base_url:
+            # self-hosted OpenAI-compatible servers usually don't check the key
+            api_key = "none"
+        return api_key
+
+    def preload(self, done=None):
+        """
+        Import the SDKs of the configured providers in a background thread,
+        so the first send doesn't pay for them. No client is created.
+        """
+        def run():
+            for module in dict.fromkeys(sdk_modules[p.type] for p in self.providers.providers.values()):
+                start = time.perf_counter()
+                try:
+                    importlib.import_module(module)
+                except ImportError as e:
+                    self.logger.error(f"Error importing {module}: {e}")
+                    continue
+                self.logger.debug(f"Imported {module} in {time.perf_counter() - start:.2f}s")
+            if done is not None:
+                done()
+
+        threading.Thread(target=run, name="SDKPreload", daemon=True).start()
+
+    def get_client(self, name: str):
+        """Return the provider's client, creating it on first use (None if it can't be created)."""
+        with self.lock:
+            if name not in self.clients:
+                client = self.create_client(self.providers.get(name))
+                if client is None:
+                    return None
+                self.clients[name] = client
+            return self.clients[name]
+
+    def create_client(self, provider: Provider):
+        api_key = self.api_key(provider)
+        if api_key is None:
+            self.logger.error(f"API Key Error ({provider.name}): {provider.api_key_env} is not set")
+            return None
 
-    def get_anthropic_client(self):
         try:
-            api_key = os.environ.get("ANTHROPIC_API_KEY")
-            self.anthropic_client = Anthropic(api_key=api_key)
-            if api_key is None:
-                self.anthropic_client = None
-                self.logger.error(f"Anthropic client not initialized")
+            if provider.type == "openai":
+                import openai
+                client = openai.OpenAI(
+                    api_key=api_key,
+                    base_url=provider.base_url,
+                    max_retries=0, # retries are scheduled by RequestScheduler
+                    timeout=self.timeout(provider.name),
+                    http_client=self.create_http_client(provider.name, openai.DefaultHttpxClient),
+                )
+            elif provider.type == "anthropic":
+                import anthropic
+                client = anthropic.Anthropic(
+                    api_key=api_key,
+                    base_url=provider.base_url,
+                    max_retries=0, # retries are scheduled by RequestScheduler
+                    timeout=self.timeout(provider.name),
+                    http_client=self.create_http_client(provider.name, anthropic.DefaultHttpxClient),
+                )
             else:
-                self.logger.info(f"Anthropic client initialized")
-        except KeyError as e:
-            self.logger.error(f"API Key Error (Anthropic): {e}")
+                http_client = self.create_http_client(provider.name, timeout=self.timeout(provider.name))
+                client = Perplexity_client(api_key, http_client)
         except Exception as e:
-            self.logger.error(f"Error (Anthropic): {e}")
+            self.logger.error(f"Error ({provider.name}): {e}")
+            return None
 
-    def get_perplexity_client(self):
-        try:
-            api_key = os.environ.get("PERPLEXITY_API_KEY")
-            self.perplexity_client = Perplexity_client(api_key)
-            self.logger.info(f"Perplexity client initialized")
-        except KeyError as e:
-            self.logger.error(f"API Key Error (Perplexity): {e}")
-        except Exception as e:
-            self.logger.error(f"Error (Perplexity): {e}")
\ No newline at end of file
+        self.logger.info(f"{provider.name} client initialized")
+        return client
+
+    def get_async_client(self, name: str):
+        """
+        Return the async client for the provider, creating it on first use.
+
+        Must be called from the AsyncEngine's event loop. Returns None when the
+        client can't be created (e.g. missing API key).
+        """
+        if name in self.async_clients:
+            return self.async_clients[name]
+
+        provider = self.providers.get(name)
+        api_key = self.api_key(provider)
+        client = None
+        if api_key is None:
+            self.logger.error(f"API Key Error ({name}): {provider.api_key_env} is not set")
+        elif provider.type == "openai":
+            import openai
+            client = openai.AsyncOpenAI(
+                api_key=api_key,
+                base_url=provider.base_url,
+                max_retries=0, # retries are scheduled by RequestScheduler
+                timeout=self.timeout(name),
+                http_client=self.create_http_client(name, openai.DefaultAsyncHttpxClient, is_async=True),
+            )
+        elif provider.type == "anthropic":
+            import anthropic
+            client = anthropic.AsyncAnthropic(
+                api_key=api_key,
+                base_url=provider.base_url,
+                max_retries=0, # retries are scheduled by RequestScheduler
+                timeout=self.timeout(name),
+                http_client=self.create_http_client(name, anthropic.DefaultAsyncHttpxClient, is_async=True),
+            )
+        else:
+            client = self.create_http_client(name, is_async=True, timeout=self.timeout(name))
+
+        self.async_clients[name] = client
+        return client
+
+    def pool_summary(self) -> str:
+        return ", ".join(f"{provider}: {stats}" for provider, stats in self.pool_stats.items())
+
+    def close(self):
+        self.logger.info(f"Connection pools: {self.pool_summary()}")
+        for http_client in self.http_clients.values():
+            http_client.close()
+
+    async def aclose(self):
+        for http_client in self.async_http_clients.values():
+            await http_client.aclose()
@@ -0,0 +1,49 @@
+import asyncio
+import threading
+from logging import Logger
+from models.api_client_manager import APIClientManager
+from models.llm_client_worker import Worker
+
+
+class AsyncEngine:
+    """
+    Runs workers on a single asyncio event loop in one background thread.
+
+    Drop-in alternative to QThreadPool.start(): an in-flight request costs a
+    coroutine instead of a blocked thread. Results and chunks reach the GUI
+    through the workers' Qt signals, exactly like the thread pool path.
+    """
+    def __init__(self, clients: APIClientManager, logger: Logger) -> None:
+        self.clients = clients
+        self.logger = logger
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.run_loop, name="AsyncEngine", daemon=True)
+        self.thread.start()
+        self.logger.info("Async engine started")
+
+    def run_loop(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def start(self, worker: Worker):
+        asyncio.run_coroutine_threadsafe(self.run_worker(worker), self.loop)
+
+    async def run_worker(self, worker: Worker):
+        if worker.cancelled:
+            return
+        worker.task = asyncio.current_task()
+        try:
+            client = self.clients.get_async_client(worker.provider)
+        except Exception as e:
+            self.logger.error(f"Error creating async client ({worker.provider}): {e}")
+            client = None
+        await worker.run_async(client)
+
+    def close(self):
+        try:
+            asyncio.run_coroutine_threadsafe(self.clients.aclose(), self.loop).result(timeout=5)
+        except Exception as e:
+            self.logger.error(f"Error closing async clients: {e}")
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(timeout=5)
+        self.logger.info("Async engine stopped")
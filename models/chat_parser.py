@@ -2,114 +2,172 @@ from utils.setting import response_prefix, user_prefix, system_prefix
 from utils.setting import deliminator
 from typing import List, Dict
 
+role_prefixes = {
+    "system": system_prefix,
+    "user": user_prefix,
+    "assistant": response_prefix,
+}
+
+class ParsedPrefix:
+    """
+    Parser state after `text`, which ends with a deliminator: the segments
+    before it are complete and can't change when more text is added.
+    """
+    def __init__(self, text:str = ""):
+        self.text = text
+        self.messages: List[Dict] = [] # dicts are replaced, never modified, as parse() results share them
+        self.system_content = ""
+        self.last_role = None
+
 class ChatParser:
-    def __init__(self, logger):
+    """
+    Converts between the input area text and the chat message list.
+
+    The text is split into segments by the deliminator; a segment containing a
+    role prefix starts (or continues) a message of that role, other segments
+    continue the preceding user message. Both directions take one pass over
+    the segments: contents are collected as lists and joined once, so long
+    transcripts scale linearly.
+
+    An incremental parser keeps the state after the last complete segment of
+    the previous text; when the new text starts with the same prefix (e.g.
+    after Append), only the rest is parsed.
+    """
+    def __init__(self, logger, incremental:bool = False):
         self.logger = logger
+        self.incremental = incremental
+        self.prefixes: Dict[bool, ParsedPrefix] = {} # by allow_system
 
     def parse(self, text:str, allow_system:bool = True) -> List[Dict]:
-        delim = f"{deliminator}"
-
-        if delim in text:
-            list_to_return = []
-            last_role = None
-            text_list = text.split(delim)
-            self.logger.debug("number of text_list: %s", len(text_list))
-            system_content = ""
-
-            for i, txt in enumerate(text_list):
-
-                if system_prefix in txt:
-                    if allow_system:
-                        system_content = txt.replace(system_prefix, "")
-                        last_role = "system"
-
-                    else:
-                        if last_role == "user":
-                            list_to_return[-1]["content"] += txt
-                        else:
-                            list_to_return.append({
-                                "role": "user",
-                                "content": txt
-                            })
-                            last_role = "user"
-
-                elif user_prefix in txt and last_role != "user":
-                    content = txt.replace(user_prefix, "")
-
-                    list_to_return.append({
-                        "role": "user",
-                        "content": content
-                    })
-                    last_role = "user"
-
-                elif user_prefix in txt and last_role == "user":
-                    content = txt.replace(user_prefix, "")
-                    list_to_return[-1]["content"] += content
-                    last_role = "user"
-
-                elif response_prefix in txt and last_role != "assistant":
-                    content = txt.replace(response_prefix, "")
-                    list_to_return.append({
-                        "role": "assistant",
-                        "content": content
-                    })
-                    last_role = "assistant"
-
-                elif response_prefix in txt and last_role == "assistant":
-                    content = txt.replace(response_prefix, "")
-                    list_to_return[-1]["content"] += content
-                    last_role = "assistant"
-
-                elif last_role == "user":
-                    list_to_return[-1]["content"] += txt
-                    last_role = "user"
-
-                else:
-                    list_to_return.append({
-                        "role": "user",
-                        "content": txt
-                    })
-                    last_role = "user"
-
-            if system_content:
-                list_to_return.insert(0, {
-                    "role": "system",
-                    "content": system_content
-                })
-
-            self.logger.debug(f"{len(list_to_return)} messages parsed")
-            len_user = len([m for m in list_to_return if m['role'] == 'user'])
-            len_assistant = len([m for m in list_to_return if m['role'] == 'assistant'])
-            len_system = len([m for m in list_to_return if m['role'] == 'system'])
-            self.logger.debug(f"User: {len_user}, Assistant: {len_assistant}, System: {len_system}")
-
-
-            return list_to_return
-
-
-        else:
+        if deliminator not in text:
             self.logger.debug('single text')
             return [{
                 "role": "user",
                 "content": text
             }]
 
+        prefix = self.parse_prefix(text, allow_system)
+        last_segment = text[len(prefix.text):]
+
+        # the last segment may still change, so it's parsed into a copy
+        state = ParsedPrefix()
+        state.messages = list(prefix.messages)
+        state.system_content = prefix.system_content
+        state.last_role = prefix.last_role
+        self.extend(state, [last_segment], allow_system)
+
+        list_to_return = state.messages
+        if state.system_content:
+            list_to_return.insert(0, {
+                "role": "system",
+                "content": state.system_content
+            })
+
+        self.logger.debug(f"{len(list_to_return)} messages parsed")
+        counts = {"user": 0, "assistant": 0, "system": 0}
+        for m in list_to_return:
+            counts[m["role"]] += 1
+        self.logger.debug(f"User: {counts['user']}, Assistant: {counts['assistant']}, System: {counts['system']}")
+
+        return list_to_return
+
+    def parse_prefix(self, text:str, allow_system:bool = True) -> ParsedPrefix:
+        """State after the complete segments of text (all but the last one)."""
+        prefix = self.prefixes.get(allow_system)
+        if prefix is not None and text.startswith(prefix.text):
+            self.logger.debug(f"Parsing from the cached prefix ({len(prefix.text)} of {len(text)} characters)")
+        else:
+            prefix = ParsedPrefix()
+
+        segments = text[len(prefix.text):].split(deliminator)
+        last_segment = segments.pop()
+        if segments:
+            self.extend(prefix, segments, allow_system)
+            prefix.text = text[:len(text) - len(last_segment)]
+        if self.incremental:
+            self.prefixes[allow_system] = prefix
+        return prefix
+
+    def extend(self, state:ParsedPrefix, segments:List[str], allow_system:bool):
+        messages = state.messages
+        # contents added to messages[-1] by this call, joined once at the end
+        merged = None
+
+        for txt in segments:
+            # a segment with several prefixes takes the first role of system, user, assistant
+            if system_prefix in txt and allow_system:
+                # the last system segment wins
+                state.system_content = txt.replace(system_prefix, "")
+                state.last_role = "system"
+                continue
+            elif system_prefix in txt:
+                role, content = "user", txt # kept as is, as user text
+            elif user_prefix in txt:
+                role, content = "user", txt.replace(user_prefix, "")
+            elif response_prefix in txt:
+                role, content = "assistant", txt.replace(response_prefix, "")
+            else:
+                role, content = "user", txt
+
+            if state.last_role == role:
+                if merged is None:
+                    merged = [messages[-1]["content"]]
+                merged.append(content)
+            else:
+                self.merge(messages, merged)
+                merged = None
+                messages.append({"role": role, "content": content})
+            state.last_role = role
+
+        self.merge(messages, merged)
+
+    @staticmethod
+    def merge(messages:List[Dict], merged:List[str]):
+        if merged is not None:
+            messages[-1] = {"role": messages[-1]["role"], "content": "".join(merged)}
+
     def to_str(self, chat:list) -> str:
-        chat_str = ""
+        parts = []
         for c in chat:
-            if c["role"] == "user":
-                c['content'] = c['content'].replace(user_prefix, "")
-                chat_str += f"{user_prefix} {c['content']}\n"
-            elif c["role"] == "assistant":
-                c['content'] = c['content'].replace(response_prefix, "")
-                chat_str += f"{response_prefix} {c['content']}\n"
-            elif c["role"] == "system":
-                c['content'] = c['content'].replace(system_prefix, "")
-                chat_str += f"{system_prefix} {c['content']}\n"
-            
-            chat_str += deliminator + "\n"
-
-        # remove the last deliminator and the newline character
-        chat_str = chat_str[:-len(deliminator)-1]
-
-        return chat_str
\ No newline at end of file
+            prefix = role_prefixes.get(c["role"])
+            if prefix is not None:
+                parts.append(f"{prefix}{self.strip_format(c['content'].replace(prefix, ''))}\n")
+            parts.append(deliminator + "\n")
+
+        # without the last deliminator and its newline
+        if parts:
+            parts.pop()
+        return "".join(parts)
+
+    @staticmethod
+    def strip_format(content:str) -> str:
+        """
+        The content as written after its prefix: without the newlines around
+        it, which parse() keeps from the format, and starting with a space
+        (added only if missing). Parsing and serializing again, e.g. on each
+        Append, gives the same text.
+        """
+        content = content.strip("\n")
+        return content if content.startswith(" ") else " " + content
+
+    def from_str(self, text:str) -> List[Dict]:
+        """
+        Inverse of to_str: the messages of a prompt as stored in the history
+        (also by earlier versions, which didn't strip the format's whitespace),
+        or None if text isn't in that form.
+        """
+        parts = text.split(f"\n{deliminator}\n")
+        if not parts[-1].endswith("\n"):
+            return None
+        parts[-1] = parts[-1][:-1]
+
+        messages = []
+        for part in parts:
+            for role, prefix in role_prefixes.items():
+                if part.startswith(prefix + " "):
+                    messages.append({"role": role, "content": self.strip_format(part[len(prefix):])})
+                    break
+            else:
+                return None
+
+        return messages
@@ -18,10 +18,34 @@ default_config = {
         "Sonar_3.1_70B": "llama-3.1-sonar-large-128k-online",
         "Sonar_3.1_405B": "llama-3.1-sonar-huge-128k-online"
     },
+    "providers": {},
     "prompts": {
         "Default": "This is a default prompt.",
         "J2E": "Translate to natural American English.",
         "Proofread":"Please proofread and revise the following English text to make it sound more natural. Additionally, at the end, explain any grammatical errors or areas for improvement",
+    },
+    "stream": True,
+    "max_concurrency": 8,
+    "engine": "threadpool",
+    "cache": {
+        "enabled": True,
+        "max_entries": 1000,
+        "max_age_days": 30
+    },
+    "rate_limits": {
+        "openai": {"requests_per_minute": 500, "tokens_per_minute": 0},
+        "anthropic": {"requests_per_minute": 50, "tokens_per_minute": 0},
+        "perplexity": {"requests_per_minute": 50, "tokens_per_minute": 0}
+    },
+    "retry": {
+        "max_retries": 5,
+        "base_delay": 1.0,
+        "max_delay": 60.0
+    },
+    "timeouts": {
+        "openai": {"connect": 5, "read": 120, "total": 600},
+        "anthropic": {"connect": 5, "read": 120, "total": 600},
+        "perplexity": {"connect": 5, "read": 120, "total": 600}
     }
 }
 
@@ -31,6 +55,14 @@ class Config:
     openai_models: dict = None
     anthropic_models: dict = None
     perplexity_models: dict = None
+    providers: dict = None # additional providers, e.g. OpenAI-compatible endpoints by base_url
+    stream: bool = True
+    max_concurrency: int = 8
+    engine: str = "threadpool" # "threadpool" or "asyncio"
+    cache: dict = None
+    rate_limits: dict = None # per provider, 0 = unlimited
+    retry: dict = None
+    timeouts: dict = None # per provider, in seconds
 
 
 class ConfigManager:
@@ -50,6 +82,14 @@ class ConfigManager:
             self.config.openai_models = config_dict.get("openai_models", {})
             self.config.anthropic_models = config_dict.get("anthropic_models", {})
             self.config.perplexity_models = config_dict.get("perplexity_models", {})
+            self.config.providers = config_dict.get("providers", default_config["providers"])
+            self.config.stream = config_dict.get("stream", default_config["stream"])
+            self.config.max_concurrency = config_dict.get("max_concurrency", default_config["max_concurrency"])
+            self.config.engine = config_dict.get("engine", default_config["engine"])
+            self.config.cache = {**default_config["cache"], **config_dict.get("cache", {})}
+            self.config.rate_limits = {**default_config["rate_limits"], **config_dict.get("rate_limits", {})}
+            self.config.retry = {**default_config["retry"], **config_dict.get("retry", {})}
+            self.config.timeouts = {**default_config["timeouts"], **config_dict.get("timeouts", {})}
 
 
         except FileNotFoundError as e:
@@ -59,6 +99,14 @@ class ConfigManager:
             self.config.openai_models = default_config["openai_models"]
             self.config.anthropic_models = default_config["anthropic_models"]
             self.config.perplexity_models = default_config["perplexity_models"]
+            self.config.providers = default_config["providers"]
+            self.config.stream = default_config["stream"]
+            self.config.max_concurrency = default_config["max_concurrency"]
+            self.config.engine = default_config["engine"]
+            self.config.cache = default_config["cache"]
+            self.config.rate_limits = default_config["rate_limits"]
+            self.config.retry = default_config["retry"]
+            self.config.timeouts = default_config["timeouts"]
 
             # save the default configuration
             with open(self.json_path, "w") as f:
@@ -76,7 +124,7 @@ class ConfigManager:
             self.logger.error("No prompts found in config.json")
             self.config.prompts = default_config["prompts"]
 
-        if not self.config.openai_models and not self.config.anthropic_models:
+        if not self.config.openai_models and not self.config.anthropic_models and not self.config.providers:
             self.logger.error("No models found in config.json")
             self.config.openai_models = default_config["openai_models"]
             self.config.anthropic_models = default_config["anthropic_models"]
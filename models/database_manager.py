@@ -1,15 +1,310 @@
 import sqlite3
 from pathlib import Path
-from PySide6.QtCore import QObject
+from PySide6.QtCore import QObject, Signal
 import re
+import math
+import queue
+import hashlib
+import threading
+import zlib
+import datetime
+from dataclasses import dataclass
 from models.llm_client_worker import LLMResults
-from typing import List
+from models.chat_parser import ChatParser
+from utils.setting import search_rank_window, search_snippet_tokens, snippet_start, snippet_end, history_preview_length, compress_threshold
+from utils.setting import outbox_keep_days
+from typing import List, Tuple, Callable, Dict
+
+# Prompts and responses (history.query / response, messages.content) longer
+# than compress_threshold are stored as zlib-compressed UTF-8 BLOBs, shorter
+# ones as TEXT: the storage class tells them apart. In SQL, body(column)
+# gives the text either way (registered by open_connection()).
+def compress_body(text:str):
+    if text is None or len(text) < compress_threshold:
+        return text
+    data = zlib.compress(text.encode("utf-8"))
+    return data if len(data) < len(text) else text
+
+def body_text(value) -> str:
+    return zlib.decompress(value).decode("utf-8") if isinstance(value, bytes) else value
+
+def open_connection(db_path) -> sqlite3.Connection:
+    conn = sqlite3.connect(db_path)
+    conn.create_function("body", 1, body_text, deterministic=True)
+    return conn
+
+# full-text index of query and response, kept in sync with history by triggers.
+# The trigram tokenizer matches any substring of 3+ characters, so it works for
+# Japanese (no spaces between words) as well as English. The index reads the
+# text through the history_text view, which decompresses the bodies.
+fts_statements = [
+    "CREATE VIEW IF NOT EXISTS history_text AS SELECT id, body(query) AS query, body(response) AS response FROM history",
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS history_fts USING fts5(
+        query, response, content='history_text', content_rowid='id', tokenize='trigram'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS history_fts_insert AFTER INSERT ON history BEGIN
+        INSERT INTO history_fts(rowid, query, response) VALUES (new.id, body(new.query), body(new.response));
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS history_fts_delete AFTER DELETE ON history BEGIN
+        INSERT INTO history_fts(history_fts, rowid, query, response) VALUES ('delete', old.id, body(old.query), body(old.response));
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS history_fts_update AFTER UPDATE OF query, response ON history BEGIN
+        INSERT INTO history_fts(history_fts, rowid, query, response) VALUES ('delete', old.id, body(old.query), body(old.response));
+        INSERT INTO history_fts(rowid, query, response) VALUES (new.id, body(new.query), body(new.response));
+    END
+    """,
+]
+
+# for changes to every row: create_fts() rebuilds the index afterwards
+drop_fts_statements = [
+    "DROP TRIGGER IF EXISTS history_fts_insert",
+    "DROP TRIGGER IF EXISTS history_fts_delete",
+    "DROP TRIGGER IF EXISTS history_fts_update",
+    "DROP TABLE IF EXISTS history_fts",
+]
+
+# columns added after the first release, migrated in place on startup
+added_columns = {
+    "temperature": "INTEGER",
+    "batch_id": "TEXT",
+    "cached": "INTEGER DEFAULT 0",
+    "error": "INTEGER DEFAULT 0",
+    "queue_ms": "REAL",
+    "ttfb_ms": "REAL",
+    "latency_ms": "REAL",
+    "input_tokens": "INTEGER",
+    "output_tokens": "INTEGER",
+    "retries": "INTEGER DEFAULT 0",
+    "query_preview": "TEXT",
+    "response_preview": "TEXT",
+    "message_id": "INTEGER",
+}
+
+# Conversations as a tree of messages, each stored once: a history row points
+# at the last message of its prompt (message_id), and the prompt is the path
+# from the root to it. A follow-up adds two messages (the response and the new
+# question) under its parent turn; editing an earlier turn starts a branch.
+# For such rows history.query only holds the messages after the last response
+# (what was asked in that turn), which is what the search looks at.
+message_statements = [
+    """
+    CREATE TABLE IF NOT EXISTS messages (
+        id INTEGER PRIMARY KEY,
+        parent_id INTEGER REFERENCES messages(id),
+        role TEXT NOT NULL,
+        content TEXT NOT NULL,
+        digest TEXT NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS messages_child ON messages (parent_id, digest)",
+    "CREATE INDEX IF NOT EXISTS history_message ON history (message_id)",
+]
+
+# the history list reads only this index (keyset pages in datetime order), never the bodies
+history_list_index = """
+CREATE INDEX IF NOT EXISTS history_list ON history (datetime, id, model, query_preview, response_preview)
+"""
+
+# The request outbox: each request is written here before it is sent, and
+# marked done (or failed) in the transaction that stores its result in the
+# history. Requests still pending or in flight when the app stopped (crash,
+# sleep, quit) are sent again on the next launch.
+request_statements = [
+    """
+    CREATE TABLE IF NOT EXISTS requests (
+        request_id TEXT PRIMARY KEY,
+        batch_id TEXT,
+        prompt TEXT NOT NULL,
+        model TEXT NOT NULL,
+        temperature INTEGER,
+        status TEXT NOT NULL, -- pending, in_flight, done or failed
+        created TEXT NOT NULL,
+        history_id INTEGER
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS requests_status ON requests (status, created)",
+]
+
+@dataclass
+class QueuedRequest:
+    """A request of the outbox not answered yet."""
+    request_id: str
+    batch_id: str
+    prompt: str
+    model: str
+    temperature: int
+
+@dataclass
+class HistorySummary:
+    """A row of the history list: the start of the prompt and response (get_one_item() has the full item)."""
+    id: int
+    model: str
+    datetime: str
+    prompt_preview: str
+    response_preview: str
+    # history search: the matched part of the prompt / response, see DatabaseManager.search()
+    prompt_snippet: str = None
+    response_snippet: str = None
+
+    @property
+    def page_key(self) -> Tuple[str, int]:
+        return (self.datetime, self.id)
+
+def percentile(values: List[float], p: float) -> float:
+    """Nearest-rank percentile of sorted values."""
+    return values[max(math.ceil(p / 100 * len(values)) - 1, 0)]
+
+class HistoryWriter:
+    """
+    Runs the writes to the history database on its own thread and connection.
+
+    Writes queued while a transaction is committing go together in the next
+    one (group commit), so a burst of responses costs one fsync instead of
+    one each. on_done(done, result) is called on this thread for each write
+    that has a done callback; result is None if the write failed.
+    """
+    def __init__(self, logger, db_path, on_done: Callable):
+        self.logger = logger
+        self.db_name = db_path
+        self.on_done = on_done
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self.run, name="history-writer", daemon=True)
+        self.thread.start()
+
+    def submit(self, write: Callable, done: Callable = None):
+        """write(cursor) runs in a transaction; its return value is passed to done."""
+        self.queue.put((write, done))
+
+    def run(self):
+        conn = open_connection(self.db_name)
+        cursor = conn.cursor()
+        stop = False
+        while not stop:
+            writes = [self.queue.get()]
+            while True:
+                try:
+                    writes.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = None in writes
+            writes = [w for w in writes if w is not None]
+
+            try:
+                with conn:
+                    results = [write(cursor) for write, _ in writes]
+            except Exception as e:
+                # don't let one failed write take the others (or this thread) with it
+                self.logger.warning(f"Error writing {len(writes)} changes together, retrying one by one: {e}")
+                results = [self.write_one(conn, cursor, write) for write, _ in writes]
+            self.logger.debug(f"{len(writes)} changes committed")
+
+            for (_, done), result in zip(writes, results):
+                if done is not None:
+                    self.on_done(done, result)
+        conn.close()
+
+    def write_one(self, conn, cursor, write: Callable):
+        try:
+            with conn:
+                return write(cursor)
+        except Exception as e:
+            self.logger.error(f"Error writing data: {e}")
+            return None
+
+    def close(self):
+        """Wait for the queued writes."""
+        self.queue.put(None)
+        self.thread.join()
+
+
+class HistorySearcher:
+    """
+    Runs history searches on its own thread and read connection, so the GUI
+    thread never waits for one.
+
+    Only the latest submitted search matters: a new one interrupts the search
+    running (through the connection's progress handler, which SQLite calls
+    every few thousand instructions) and replaces the one waiting. on_done(done,
+    (word, results)) is called on this thread for searches that weren't
+    superseded.
+    """
+    def __init__(self, logger, db_path, search: Callable, on_done: Callable):
+        self.logger = logger
+        self.db_name = db_path
+        self.search = search
+        self.on_done = on_done
+        self.condition = threading.Condition()
+        self.pending = None # (word, done) not started yet
+        self.generation = 0 # of the latest submit
+        self.stopped = False
+        self.thread = threading.Thread(target=self.run, name="history-searcher", daemon=True)
+        self.thread.start()
+
+    def submit(self, word: str, done: Callable):
+        """Search for word (None only cancels the current search)."""
+        with self.condition:
+            self.generation += 1
+            self.pending = (word, done) if word is not None else None
+            self.condition.notify()
+
+    def run(self):
+        conn = open_connection(self.db_name)
+        cursor = conn.cursor()
+        running = None
+        # a non-zero return value interrupts the statement
+        conn.set_progress_handler(lambda: self.generation != running, 1000)
+        while True:
+            with self.condition:
+                while self.pending is None and not self.stopped:
+                    self.condition.wait()
+                if self.stopped:
+                    break
+                (word, done), self.pending = self.pending, None
+                running = self.generation
+
+            try:
+                results = self.search(cursor, word)
+            except sqlite3.Error as e:
+                if self.generation != running:
+                    self.logger.debug(f"Search for '{word}' superseded")
+                    continue
+                self.logger.error(f"Error searching for '{word}': {e}")
+                results = []
+            if self.generation == running:
+                self.on_done(done, (word, results))
+        conn.close()
+
+    def close(self):
+        with self.condition:
+            self.stopped = True
+            self.generation += 1
+            self.condition.notify()
+        self.thread.join()
+
 
 class DatabaseManager(QObject):
+    """
+    The history database. Reads run on the caller's connection; writes go
+    through a HistoryWriter and return at once, their done callbacks are
+    called on the thread that owns this object (the GUI thread).
+    """
+    # done callback, result of the write
+    write_done = Signal(object, object)
+    # done callback, (word, results) of the search
+    search_done = Signal(object, object)
+
     def __init__(self, logger, db_path):
         super().__init__()
         self.logger = logger
         self.db_name = Path(db_path)
+        self.chat_parser = ChatParser(logger)
         self.conn = None
         self.cursor = None
         self.connect()
@@ -18,16 +313,38 @@ class DatabaseManager(QObject):
         # if some columns are missing, add them
         self.cursor.execute("PRAGMA table_info(history)")
         columns = [column[1] for column in self.cursor.fetchall()]
-        if "temperature" not in columns:
-            self.cursor.execute("ALTER TABLE history ADD COLUMN temperature INTEGER")
-            self.conn
+        for column, column_type in added_columns.items():
+            if column not in columns:
+                self.cursor.execute(f"ALTER TABLE history ADD COLUMN {column} {column_type}")
+                self.conn.commit()
+        if "query_preview" not in columns:
+            self.add_previews()
+
+        self.create_list_index()
+        self.create_messages()
+        if "message_id" not in columns:
+            self.move_prompts_to_messages()
+        self.fts = self.create_fts()
+        self.create_requests()
+
+        # a method of this object, so the callbacks are queued to its thread
+        self.write_done.connect(self.on_write_done)
+        self.writer = HistoryWriter(logger, self.db_name, self.write_done.emit)
+        self.search_done.connect(self.on_search_done)
+        self.searcher = HistorySearcher(logger, self.db_name, self.run_search, self.search_done.emit)
 
+    def on_write_done(self, done: Callable, result):
+        done(result)
 
+    def on_search_done(self, done: Callable, result):
+        done(*result)
 
     def connect(self):
         try:
-            self.conn = sqlite3.connect(self.db_name)
+            self.conn = open_connection(self.db_name)
             self.cursor = self.conn.cursor()
+            # readers don't wait for the writer thread, nor it for them
+            self.cursor.execute("PRAGMA journal_mode=WAL")
         # Handle the exception if the self_db_name is not found)
 
         except sqlite3.Error as e:
@@ -41,7 +358,19 @@ class DatabaseManager(QObject):
             response TEXT NOT NULL,
             datetime TEXT NOT NULL,
             model TEXT NOT NULL,
-            temperature INTEGER
+            temperature INTEGER,
+            batch_id TEXT,
+            cached INTEGER DEFAULT 0,
+            error INTEGER DEFAULT 0,
+            queue_ms REAL,
+            ttfb_ms REAL,
+            latency_ms REAL,
+            input_tokens INTEGER,
+            output_tokens INTEGER,
+            retries INTEGER DEFAULT 0,
+            query_preview TEXT,
+            response_preview TEXT,
+            message_id INTEGER
         )
         """
         try:
@@ -50,129 +379,393 @@ class DatabaseManager(QObject):
         except sqlite3.Error as e:
             self.logger.error(f"Error creating table: {e}")
 
-    def insert_history(self, result: LLMResults):
-        insert_query = """
-        INSERT INTO history (query, response, datetime, model, temperature)
-        VALUES (?, ?, ?, ?, ?)
+    def add_previews(self):
+        """Fill the preview columns of the rows stored before they existed."""
+        try:
+            with self.conn:
+                self.cursor.execute(
+                    "UPDATE history SET query_preview = substr(body(query), 1, ?), response_preview = substr(body(response), 1, ?)",
+                    (history_preview_length, history_preview_length),
+                )
+        except sqlite3.Error as e:
+            self.logger.error(f"Error adding previews: {e}")
+
+    def create_list_index(self):
+        try:
+            with self.conn:
+                self.cursor.execute(history_list_index)
+        except sqlite3.Error as e:
+            self.logger.error(f"Error creating index: {e}")
+
+    def create_messages(self):
+        try:
+            with self.conn:
+                for statement in message_statements:
+                    self.cursor.execute(statement)
+        except sqlite3.Error as e:
+            self.logger.error(f"Error creating the messages table: {e}")
+
+    def move_prompts_to_messages(self):
         """
+        Store the prompts of the rows written before the messages table in it,
+        sharing the turns they have in common, and reclaim the space.
 
+        Only the newlines the format puts around each message are dropped (see
+        ChatParser.strip_format()), so the prompts are rebuilt as they were,
+        indentation and trailing spaces included.
+        """
         try:
-            self.cursor.execute(
-                insert_query,
-                (result.prompt, result.response, result.datetime, result.model, result.temperature),
+            self.cursor.execute("SELECT id FROM history ORDER BY id")
+            ids = [row[0] for row in self.cursor.fetchall()]
+            self.logger.info(f"Moving the prompts of {len(ids)} history items to the messages table")
+            with self.conn:
+                # indexed again from scratch, cheaper than updating it row by row
+                for statement in drop_fts_statements:
+                    self.cursor.execute(statement)
+                for id in ids:
+                    self.cursor.execute("SELECT query FROM history WHERE id = ?", (id,))
+                    query, message_id = self.store_prompt(self.cursor, body_text(self.cursor.fetchone()[0]))
+                    if message_id is not None:
+                        self.cursor.execute("UPDATE history SET query = ?, message_id = ? WHERE id = ?", (compress_body(query), message_id, id))
+            self.cursor.execute("VACUUM")
+        except sqlite3.Error as e:
+            self.logger.error(f"Error moving prompts to the messages table: {e}")
+
+    def store_prompt(self, cursor, prompt:str) -> Tuple[str, int]:
+        """
+        Store the messages of prompt, reusing the ones already stored with the
+        same parent. Returns (the query column, message_id), or (prompt, None)
+        if it can't be split into messages.
+        """
+        messages = self.chat_parser.from_str(prompt)
+        if not messages:
+            return prompt, None
+
+        parent_id = None
+        for message in messages:
+            digest = hashlib.sha256(f"{message['role']}\n{message['content']}".encode("utf-8")).hexdigest()
+            cursor.execute(
+                "SELECT id FROM messages WHERE parent_id IS ? AND digest = ? AND role = ? AND body(content) = ?",
+                (parent_id, digest, message["role"], message["content"]),
             )
-            self.conn.commit()
+            row = cursor.fetchone()
+            if row is None:
+                cursor.execute(
+                    "INSERT INTO messages (parent_id, role, content, digest) VALUES (?, ?, ?, ?)",
+                    (parent_id, message["role"], compress_body(message["content"]), digest),
+                )
+                parent_id = cursor.lastrowid
+            else:
+                parent_id = row[0]
+
+        # what was asked in this turn: the messages after the last response
+        responses = [i for i, m in enumerate(messages) if m["role"] == "assistant"]
+        turn = messages[responses[-1] + 1:] if responses else messages
+        return self.chat_parser.to_str(turn or messages[-1:]), parent_id
+
+    def get_messages(self, message_id:int) -> List[Dict]:
+        """The conversation ending with the message: its path from the root."""
+        self.cursor.execute("""
+        WITH RECURSIVE path(id, parent_id, role, content, depth) AS (
+            SELECT id, parent_id, role, content, 0 FROM messages WHERE id = ?
+            UNION ALL
+            SELECT m.id, m.parent_id, m.role, m.content, p.depth + 1 FROM messages m JOIN path p ON m.id = p.parent_id
+        )
+        SELECT role, content FROM path ORDER BY depth DESC
+        """, (message_id,))
+        return [{"role": role, "content": body_text(content)} for role, content in self.cursor.fetchall()]
+
+    @staticmethod
+    def prune_messages(cursor, message_id:int):
+        """Delete the message and its ancestors, as long as no history row or other message uses them."""
+        while message_id is not None:
+            cursor.execute(
+                "SELECT 1 FROM history WHERE message_id = ? UNION ALL SELECT 1 FROM messages WHERE parent_id = ? LIMIT 1",
+                (message_id, message_id),
+            )
+            if cursor.fetchone() is not None:
+                return
+            cursor.execute("SELECT parent_id FROM messages WHERE id = ?", (message_id,))
+            row = cursor.fetchone()
+            cursor.execute("DELETE FROM messages WHERE id = ?", (message_id,))
+            message_id = row[0] if row else None
+
+    def create_requests(self):
+        """Create the request outbox, without the requests answered more than outbox_keep_days ago."""
+        try:
+            with self.conn:
+                for statement in request_statements:
+                    self.cursor.execute(statement)
+                cutoff = datetime.datetime.now() - datetime.timedelta(days=outbox_keep_days)
+                self.cursor.execute("DELETE FROM requests WHERE status IN ('done', 'failed') AND created < ?", (cutoff.isoformat(),))
         except sqlite3.Error as e:
-            self.logger.error(f"Error inserting data: {e}")
+            self.logger.error(f"Error creating the requests table: {e}")
+
+    def add_request(self, request_id:str, batch_id:str, prompt:str, model:str, temperature:int, done: Callable = None):
+        """Write a request to the outbox as pending; done(True) once committed (None if the write failed)."""
+        def add(cursor):
+            cursor.execute(
+                "INSERT OR IGNORE INTO requests (request_id, batch_id, prompt, model, temperature, status, created) VALUES (?, ?, ?, ?, ?, 'pending', ?)",
+                (request_id, batch_id, compress_body(prompt), model, temperature, datetime.datetime.now().isoformat()),
+            )
+            return True
+
+        self.writer.submit(add, done)
+
+    def set_request_status(self, request_id:str, status:str):
+        """Of a request not answered yet: pending, in_flight, or failed if it can't be sent. Results set done / failed (see insert_history_batch())."""
+        def update(cursor):
+            cursor.execute("UPDATE requests SET status = ? WHERE request_id = ? AND status IN ('pending', 'in_flight')", (status, request_id))
 
-    def get_n_history(self, n) -> List[LLMResults]:
-        select_query = "SELECT * FROM history ORDER BY datetime DESC LIMIT ?"
+        self.writer.submit(update)
+
+    def get_open_requests(self) -> List[QueuedRequest]:
+        """The requests pending or in flight, oldest first: the ones to send again on startup."""
+        select_query = """
+        SELECT request_id, batch_id, prompt, model, temperature FROM requests
+        WHERE status IN ('pending', 'in_flight') ORDER BY created
+        """
         try:
-            self.cursor.execute(select_query, (n,))
-            items = []
-            for item in self.cursor.fetchall():
+            self.cursor.execute(select_query)
+            return [QueuedRequest(request_id, batch_id, body_text(prompt), model, temperature) for request_id, batch_id, prompt, model, temperature in self.cursor.fetchall()]
+        except sqlite3.Error as e:
+            self.logger.error(f"Error fetching requests: {e}")
+            return []
 
-                items.append(
-                    LLMResults(
-                        id=item[0],
-                        prompt=item[1],
-                        response=item[2],
-                        datetime=item[3],
-                        model=item[4],
-                        temperature=item[5]
+    def create_fts(self) -> bool:
+        """
+        Create the full-text index (indexing the existing rows the first time).
+        Returns False if this SQLite has no FTS5 trigram tokenizer (3.34+), in
+        which case search() falls back to LIKE.
+        """
+        try:
+            self.cursor.execute("SELECT sql FROM sqlite_master WHERE name = 'history_fts'")
+            row = self.cursor.fetchone()
+            exists = row is not None and "history_text" in row[0]
+            with self.conn:
+                if not exists:
+                    # also an index of the history table itself, before compression
+                    for statement in drop_fts_statements:
+                        self.cursor.execute(statement)
+                for statement in fts_statements:
+                    self.cursor.execute(statement)
+                if not exists:
+                    self.logger.info("Indexing the history for search")
+                    self.cursor.execute("INSERT INTO history_fts(history_fts) VALUES ('rebuild')")
+            return True
+        except sqlite3.Error as e:
+            self.logger.warning(f"Full-text search unavailable (SQLite {sqlite3.sqlite_version}): {e}")
+            return False
+
+    def insert_history(self, result: LLMResults, done: Callable = None):
+        self.insert_history_batch([result], done)
+
+    def insert_history_batch(self, results: List[LLMResults], done: Callable = None):
+        """
+        Insert several results in one transaction (e.g. the responses of a fan-out send).
+        The rows are written by the writer thread; done(ids) gets their ids, in order.
+
+        Their requests in the outbox are marked done (failed for errors) in the
+        same transaction. A result whose request is already answered isn't
+        stored again: its id is the row stored the first time, unless that
+        row has been deleted since.
+        """
+        insert_query = """
+        INSERT INTO history (query, response, datetime, model, temperature, batch_id, cached,
+                             error, queue_ms, ttfb_ms, latency_ms, input_tokens, output_tokens, retries,
+                             query_preview, response_preview, message_id)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """
+
+        def insert(cursor):
+            ids = []
+            for result in results:
+                if result.request_id is not None:
+                    cursor.execute("SELECT history.id FROM requests JOIN history ON history.id = requests.history_id WHERE request_id = ?", (result.request_id,))
+                    row = cursor.fetchone()
+                    if row is not None:
+                        ids.append(row[0])
+                        continue
+
+                response = result.response or ""
+                query, message_id = self.store_prompt(cursor, result.prompt)
+                cursor.execute(insert_query, (
+                    compress_body(query), compress_body(response), result.datetime, result.model, result.temperature, result.batch_id, int(result.cached),
+                    int(result.error), result.queue_ms, result.ttfb_ms, result.latency_ms, result.input_tokens, result.output_tokens, result.retries,
+                    result.prompt[:history_preview_length], response[:history_preview_length], message_id,
+                ))
+                ids.append(cursor.lastrowid)
+                if result.request_id is not None:
+                    cursor.execute(
+                        "UPDATE requests SET status = ?, history_id = ? WHERE request_id = ?",
+                        ("failed" if result.error else "done", cursor.lastrowid, result.request_id),
                     )
-                )
-            return items
+            return ids
+
+        self.writer.submit(insert, done)
+
+    def get_history_page(self, n:int, after:Tuple[str, int] = None) -> List[HistorySummary]:
+        """
+        The n newest rows of the history list, or the n rows following `after`
+        (the page_key of the last row of the previous page).
+        """
+        select_query = f"""
+        SELECT id, model, datetime, query_preview, response_preview FROM history
+        {'WHERE (datetime, id) < (?, ?)' if after else ''}
+        ORDER BY datetime DESC, id DESC LIMIT ?
+        """
+        try:
+            self.cursor.execute(select_query, (*after, n) if after else (n,))
+            return [HistorySummary(*row) for row in self.cursor.fetchall()]
 
         except sqlite3.Error as e:
             self.logger.error(f"Error fetching data: {e}")
             return []
 
+    def get_summaries(self, ids:List[int]) -> List[HistorySummary]:
+        """The history list rows of the given ids, newest first."""
+        select_query = f"""
+        SELECT id, model, datetime, query_preview, response_preview FROM history
+        WHERE id IN ({', '.join('?' * len(ids))})
+        ORDER BY datetime DESC, id DESC
+        """
+        try:
+            self.cursor.execute(select_query, list(ids))
+            return [HistorySummary(*row) for row in self.cursor.fetchall()]
+        except sqlite3.Error as e:
+            self.logger.error(f"Error fetching data: {e}")
+            return []
+
     def get_one_item(self, id) -> LLMResults:
-        select_query = "SELECT * FROM history WHERE id = ?"
+        select_query = "SELECT id, query, response, datetime, model, temperature, message_id FROM history WHERE id = ?"
         try:
             self.cursor.execute(select_query, (id,))
             item = self.cursor.fetchone()
             if item:
-                return LLMResults(
-                    id=item[0],
-                    prompt=item[1],
-                    response=item[2],
-                    datetime=item[3],
-                    model=item[4],
-                    temperature=item[5]
-                )
+                return self.to_result(item)
             else:
                 return None
         except sqlite3.Error as e:
             self.logger.error(f"Error fetching data: {e}")
             return None
 
-    def delete_history(self, id):
+    def to_result(self, row) -> LLMResults:
+        """LLMResults of (id, query, response, datetime, model, temperature, message_id), with the full prompt."""
+        prompt = body_text(row[1]) if row[6] is None else self.chat_parser.to_str(self.get_messages(row[6]))
+        return LLMResults(
+            id=row[0],
+            prompt=prompt,
+            response=body_text(row[2]),
+            datetime=row[3],
+            model=row[4],
+            temperature=row[5],
+        )
+
+    def delete_history(self, id, done: Callable = None):
         """
         Delete a record from the 'history' table based on the given id.
 
         Parameters:
         - id: The id of the record to be deleted.
-
-        Raises:
-        - sqlite3.Error: If there is an error deleting the data.
+        - done: called once deleted (by the writer thread).
 
         Returns:
         None
         """
-        delete_query = "DELETE FROM history WHERE id = ?"
-        try:
-            self.cursor.execute(delete_query, (id,))
-            self.conn.commit()
-        except sqlite3.Error as e:
-            self.logger.error(f"Error deleting data: {e}")
+        def delete(cursor):
+            cursor.execute("SELECT message_id FROM history WHERE id = ?", (id,))
+            row = cursor.fetchone()
+            cursor.execute("DELETE FROM history WHERE id = ?", (id,))
+            if row is not None:
+                # the messages no other conversation uses
+                self.prune_messages(cursor, row[0])
+            return id
 
-    def search(self, word:str) -> List[LLMResults]:
+        self.writer.submit(delete, done)
+
+    def search(self, word:str, ids:List[int] = None) -> List[HistorySummary]:
         """
         Search for items in the history table based on a given word.
+
+        Every word (separated by spaces or full-width spaces) must appear in the
+        query or the response. Words of 3+ characters are looked up in the
+        full-text index, with snippets of the matched text in prompt_snippet /
+        response_snippet (between snippet_start and snippet_end). Shorter words,
+        which the trigram index can't look up, are filtered with LIKE.
+
+        Results are ranked by BM25, whose IDF counts every row matching each
+        word: when a word matches more than search_rank_window rows, the newest
+        matches come first instead, which reads the index in rowid order and
+        stops after 100.
         Args:
             word (str): The word to search for.
+            ids (list): only among these rows (e.g. the ones just written), newest first.
         Returns:
-            list: A list of dictionaries representing the matching items. Each dictionary contains the following keys:
-                - id (int): The ID of the item.
-                - query (str): The query associated with the item.
-                - response (str): The response associated with the item.
-                - datetime (str): The datetime of the item.
-                - model (str): The model associated with the item.
-                - temperature (int): The temperature associated with the item.
-        """
-        # separate the words by space or full-width space
-        words = re.split(r"[\s　]+", word)
-
-        # develop the search query
-        conditions = []
-        params = []
-        for w in words:
-            conditions.append("(query LIKE ? OR response LIKE ?)")
-            params.extend([f"%{w}%", f"%{w}%"])
-
-        search_query = f"SELECT * FROM history WHERE {' AND '.join(conditions)} ORDER BY datetime DESC LIMIT 100"
-
-        try:
-            self.cursor.execute(search_query, params)
-            items = []
-            for item in self.cursor.fetchall():
-                items.append(
-                    LLMResults(
-                        id=item[0],
-                        prompt=item[1],
-                        response=item[2],
-                        datetime=item[3],
-                        model=item[4],
-                        temperature=item[5],
-                    )
-                )
-            return items
+            list: up to 100 matching HistorySummary.
+        """
+        try:
+            return self.run_search(self.cursor, word, ids)
         except sqlite3.Error as e:
             self.logger.error(f"Error fetching data: {e}")
             return []
 
+    def search_async(self, word:str, done:Callable):
+        """
+        search() on the searcher thread; done(word, results) is called on this
+        object's thread. A search started before it finished is interrupted.
+        """
+        self.searcher.submit(word, done)
+
+    def cancel_search(self):
+        self.searcher.submit(None, None)
+
+    def run_search(self, cursor, word:str, ids:List[int] = None) -> List[HistorySummary]:
+        """search() on the given cursor, raising sqlite3.Error."""
+        words = [w for w in re.split(r"[\s　]+", word) if w]
+        if not words:
+            return []
+
+        indexed = [w for w in words if len(w) >= 3] if self.fts else []
+        conditions = []
+        params = []
+        for w in words:
+            if w not in indexed:
+                conditions.append("(body(h.query) LIKE ? OR body(h.response) LIKE ?)")
+                params.extend([f"%{w}%", f"%{w}%"])
+        if ids is not None:
+            # on the index's rowid, which it looks up without reading every match
+            conditions.append(f"{'history_fts.rowid' if indexed else 'h.id'} IN ({', '.join('?' * len(ids))})")
+            params.extend(ids)
+
+        if indexed:
+            # each word as a quoted phrase, so that FTS5 operators and punctuation are matched literally
+            phrases = ['"' + w.replace('"', '""') + '"' for w in indexed]
+            common = ids is not None or any(self.count_matches(cursor, phrase, search_rank_window) >= search_rank_window for phrase in phrases)
+            snippet = f"'{snippet_start}', '{snippet_end}', '…', {search_snippet_tokens}"
+            search_query = f"""
+            SELECT h.id, h.model, h.datetime, h.query_preview, h.response_preview,
+                   snippet(history_fts, 0, {snippet}), snippet(history_fts, 1, {snippet})
+            FROM history_fts JOIN history h ON h.id = history_fts.rowid
+            WHERE history_fts MATCH ? {''.join(' AND ' + c for c in conditions)}
+            ORDER BY {'history_fts.rowid DESC' if common else 'bm25(history_fts)'} LIMIT 100
+            """
+            params.insert(0, " ".join(phrases))
+        else:
+            search_query = f"""
+            SELECT h.id, h.model, h.datetime, h.query_preview, h.response_preview, NULL, NULL
+            FROM history h WHERE {' AND '.join(conditions)}
+            ORDER BY h.id DESC LIMIT 100
+            """
+
+        cursor.execute(search_query, params)
+        return [HistorySummary(*row) for row in cursor.fetchall()]
+
+    @staticmethod
+    def count_matches(cursor, match:str, limit:int) -> int:
+        """Rows matching the full-text query, counting up to limit."""
+        cursor.execute("SELECT count(*) FROM (SELECT rowid FROM history_fts WHERE history_fts MATCH ? LIMIT ?)", (match, limit))
+        return cursor.fetchone()[0]
+
     def get_latest_item(self) -> LLMResults:
         """
         Get the latest record in the history table.
@@ -187,25 +780,110 @@ class DatabaseManager(QObject):
             - temperature (int): The temperature associated with the item.
         """
             
-        select_query = "SELECT * FROM history ORDER BY id DESC LIMIT 1"
+        select_query = "SELECT id, query, response, datetime, model, temperature, message_id FROM history ORDER BY id DESC LIMIT 1"
         try:
             self.cursor.execute(select_query)
             row = self.cursor.fetchone()
             if row:
-                return LLMResults(
-                    id=row[0],
-                    prompt=row[1],
-                    response=row[2],
-                    datetime=row[3],
-                    model=row[4],
-                    temperature=row[5],
-                )
+                return self.to_result(row)
             else:
                 return None
         except sqlite3.Error as e:
             self.logger.error(f"Error fetching data: {e}")
             return None
 
+    def get_model_stats(self, since: str = None) -> List[dict]:
+        """
+        Latency and throughput per model, from the requests that reached the provider
+        (cached responses and errors are left out).
+
+        Args:
+            since (str): only rows with a datetime at or after this ISO timestamp.
+        Returns:
+            list: one dict per model with n, p50/p95/p99 latency and mean time to
+            first byte (ms), mean queue wait (ms), token totals, output tokens per
+            second of generation, and retries.
+        """
+        select_query = """
+        SELECT model, latency_ms, ttfb_ms, queue_ms, input_tokens, output_tokens, retries
+        FROM history
+        WHERE latency_ms IS NOT NULL AND cached = 0 AND error = 0 AND datetime >= ?
+        ORDER BY model, latency_ms
+        """
+        try:
+            self.cursor.execute(select_query, (since or "",))
+            rows = self.cursor.fetchall()
+        except sqlite3.Error as e:
+            self.logger.error(f"Error fetching stats: {e}")
+            return []
+
+        by_model = {}
+        for row in rows:
+            by_model.setdefault(row[0], []).append(row[1:])
+
+        stats = []
+        for model, items in by_model.items():
+            latencies = [item[0] for item in items]
+            ttfbs = [item[1] for item in items if item[1] is not None]
+            queues = [item[2] for item in items if item[2] is not None]
+            input_tokens = sum(item[3] or 0 for item in items)
+            output_tokens = sum(item[4] or 0 for item in items)
+            # generation time: after the first byte, or the whole request when that's unknown
+            generation_s = sum((item[0] - (item[1] or 0)) / 1000 for item in items if item[4])
+            stats.append({
+                "model": model,
+                "n": len(items),
+                "p50_ms": percentile(latencies, 50),
+                "p95_ms": percentile(latencies, 95),
+                "p99_ms": percentile(latencies, 99),
+                "ttfb_ms": sum(ttfbs) / len(ttfbs) if ttfbs else None,
+                "queue_ms": sum(queues) / len(queues) if queues else None,
+                "input_tokens": input_tokens,
+                "output_tokens": output_tokens,
+                "tokens_per_s": output_tokens / generation_s if generation_s > 0 else None,
+                "retries": sum(item[5] or 0 for item in items),
+            })
+        return stats
+
+    def compact(self, batch_size:int = 500):
+        """
+        Compress the bodies stored uncompressed (by earlier versions, or with a
+        higher compress_threshold) and VACUUM to give the space back. Not while
+        the app is running on the same database.
+        """
+        size = self.db_name.stat().st_size
+        try:
+            with self.conn:
+                # the text doesn't change, so the index doesn't either
+                self.cursor.execute("DROP TRIGGER IF EXISTS history_fts_update")
+                for table, columns in [("history", ["query", "response"]), ("messages", ["content"])]:
+                    for column in columns:
+                        last_id = 0
+                        while True:
+                            self.cursor.execute(
+                                f"SELECT id, {column} FROM {table} WHERE id > ? AND typeof({column}) = 'text' AND length({column}) >= ? ORDER BY id LIMIT ?",
+                                (last_id, compress_threshold, batch_size),
+                            )
+                            rows = self.cursor.fetchall()
+                            if not rows:
+                                break
+                            last_id = rows[-1][0]
+                            self.cursor.executemany(
+                                f"UPDATE {table} SET {column} = ? WHERE id = ?",
+                                [(compress_body(text), id) for id, text in rows],
+                            )
+                if self.fts:
+                    for statement in fts_statements:
+                        self.cursor.execute(statement)
+            self.cursor.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            self.cursor.execute("VACUUM")
+        except sqlite3.Error as e:
+            self.logger.error(f"Error compacting the database: {e}")
+            return
+        self.logger.info(f"Compacted {self.db_name}: {size / 1e6:.1f} MB -> {self.db_name.stat().st_size / 1e6:.1f} MB")
+
     def close(self):
+        self.searcher.close()
+        self.writer.close()
         if self.conn:
             self.conn.close()
@@ -1,11 +1,18 @@
 from dataclasses import dataclass
-import openai
-import anthropic
+import json
+import time
+import uuid
+import socket
+import email.utils
+from contextvars import ContextVar
 from datetime import datetime
-import requests
 from PySide6.QtCore import QRunnable, QObject, Signal
 from models.chat_parser import ChatParser
 
+# the worker whose request is running in this thread / asyncio task;
+# APIClientManager's response hook attaches the HTTP response to it
+current_worker = ContextVar("current_worker", default=None)
+
 @dataclass
 class LLMResults:
     prompt: str
@@ -14,110 +21,433 @@ class LLMResults:
     datetime: str
     id: int = None
     temperature: int = None # 1-10
+    request_id: str = None
+    batch_id: str = None
+    cached: bool = False
+    error: bool = False
+    # metrics, in milliseconds; None for cached results and rows older than the columns
+    queue_ms: float = None # created -> first attempt started (rate limit queue, thread pool)
+    ttfb_ms: float = None # last attempt started -> first streamed chunk (or the response when not streaming)
+    latency_ms: float = None # first attempt started -> result, including retries
+    input_tokens: int = None
+    output_tokens: int = None
+    retries: int = 0
 
 class WorkerSignals(QObject):
     result = Signal(dict)
+    chunk = Signal(str, str) # request_id, text
+    retry = Signal(str, float) # request_id, Retry-After in seconds (0 if not given)
+    offline = Signal(str) # request_id; couldn't connect, to be sent again once online
 
 class Worker(QRunnable):
-    def __init__(self, prompt, model_key,model_val,temp, logger):
+    """
+    One request to a provider.
+
+    Subclasses implement request() for the QThreadPool and request_async() for
+    the AsyncEngine; both paths share the payload and the error messages.
+    """
+    provider = None
+    allow_system = True
+    retry_status_codes = (408, 409, 429)
+
+    def __init__(self, prompt, model_key,model_val,temp, logger, stream=False):
         super().__init__()
         self.prompt = prompt
         self.model_key = model_key
         self.model_val = model_val
         self.logger = logger
         self.temp = temp
+        self.stream = stream
+        self.request_id = uuid.uuid4().hex
+        self.batch_id = None
+        self.cache_key = None
+        self.cached = False
+        self.error = False
+        self.attempt = 0
+        self.max_retries = 0
+        self.resumed = 0 # times sent again after waiting for the connection
+        self.streamed = False
+        self.cancelled = False
+        self.response = None # in-flight HTTP response, closed on cancel
+        self.network_stream = None # its connection, shut down on cancel (see api_client_manager.note_network_stream())
+        self.task = None # asyncio task when run by the AsyncEngine
+        # time.monotonic() timestamps for the metrics in LLMResults
+        self.t_created = time.monotonic()
+        self.t_started = None
+        self.t_attempt = None
+        self.t_first_byte = None
+        self.input_tokens = None
+        self.output_tokens = None
         self.signals = WorkerSignals()
         self.chart_parser = ChatParser(logger)
+        self.chat = None # parsed by the caller (e.g. the controller's incremental parser)
+        self.prompt_str = None
+        self.followup = None # ParsedPrefix of prompt_str, see prepare_followup()
+
+    def parse_chat(self):
+        if self.chat is not None:
+            return self.chat
+        return self.chart_parser.parse(self.prompt, allow_system=self.allow_system)
 
     def run(self):
-        pass
+        if self.cancelled:
+            return
+
+        self.start_attempt()
+        chat = self.parse_chat()
+        token = current_worker.set(self)
+        try:
+            response = self.request(chat)
+        except Exception as e:
+            # the controller has already answered a cancelled request
+            if self.cancelled or self.should_retry(e) or self.went_offline(e):
+                return
+            self.error = True
+            response = self.error_message(e)
+        finally:
+            current_worker.reset(token)
+            # back in the pool, maybe already used by another request
+            self.network_stream = None
+
+        if not self.cancelled:
+            if not self.error:
+                self.prepare_followup(chat)
+            self.emit_result(chat, response)
+
+    async def run_async(self, client):
+        if self.cancelled:
+            return
+
+        self.start_attempt()
+        chat = self.parse_chat()
+        token = current_worker.set(self)
+        try:
+            response = await self.request_async(chat, client)
+        except Exception as e:
+            if self.cancelled or self.should_retry(e) or self.went_offline(e):
+                return
+            self.error = True
+            response = self.error_message(e)
+        finally:
+            current_worker.reset(token)
+
+        if not self.cancelled:
+            if not self.error:
+                self.prepare_followup(chat)
+            self.emit_result(chat, response)
+
+    def prepare_followup(self, chat):
+        """
+        Serialize the prompt as it will be stored (and shown again in the input
+        area) and parse it here, off the GUI thread, so that the controller only
+        has to parse what is added to it for the next send.
+        """
+        self.prompt_str = self.chart_parser.to_str(chat)
+        self.followup = self.chart_parser.parse_prefix(self.prompt_str, self.allow_system)
+
+    def start_attempt(self):
+        now = time.monotonic()
+        if self.t_started is None:
+            self.t_started = now
+        self.t_attempt = now
+        self.t_first_byte = None
+
+    def mark_first_byte(self):
+        if self.t_first_byte is None:
+            self.t_first_byte = time.monotonic()
+
+    def set_usage(self, input_tokens, output_tokens):
+        self.input_tokens = input_tokens
+        self.output_tokens = output_tokens
+
+    def cancel(self):
+        """
+        Stop the request and release its thread / connection.
+
+        An asyncio task is cancelled. A thread blocked on a response, or still
+        waiting for its headers, is woken by shutting down the socket; over
+        HTTP/2 only the stream is closed, since the connection is shared with
+        other requests.
+        """
+        self.cancelled = True
+
+        if self.task is not None:
+            self.task.get_loop().call_soon_threadsafe(self.task.cancel)
+
+        response = self.response
+        try:
+            if response is None:
+                # the asyncio task is interrupted by the cancel anyway
+                if self.task is None:
+                    self.shutdown(self.network_stream)
+                return
+            if response.http_version == "HTTP/1.1":
+                self.shutdown(response.extensions.get("network_stream"))
+            response.close()
+        except Exception as e:
+            self.logger.debug(f"Error closing response: {e}")
+
+    @staticmethod
+    def shutdown(network_stream):
+        if network_stream is not None:
+            sock = network_stream.get_extra_info("socket")
+            if sock is not None:
+                sock.shutdown(socket.SHUT_RDWR)
+
+    def should_retry(self, e: Exception) -> bool:
+        """
+        Hand a retryable failure back to the RequestScheduler via the retry signal.
+
+        Not once text has been streamed, since a retry would repeat it.
+        """
+        if self.streamed or self.attempt >= self.max_retries or not self.is_retryable(e):
+            return False
+
+        self.attempt += 1
+        self.logger.warning(f"Retryable error ({self.model_key}): {e}")
+        self.signals.retry.emit(self.request_id, self.retry_after(e))
+        return True
+
+    def went_offline(self, e: Exception) -> bool:
+        """
+        Hand a request that couldn't connect (after its retries) back to the
+        controller via the offline signal, instead of answering it with the
+        error. Not once text has been streamed.
+        """
+        if self.streamed or not self.is_offline(e):
+            return False
+
+        self.logger.warning(f"Offline ({self.model_key}): {e}")
+        self.signals.offline.emit(self.request_id)
+        return True
+
+    def is_offline(self, e: Exception) -> bool:
+        return False
+
+    def is_retryable(self, e: Exception) -> bool:
+        # rate limits and server errors; the SDK and httpx errors all carry the response
+        status = getattr(getattr(e, "response", None), "status_code", None)
+        if status is None:
+            return False
+        return status in self.retry_status_codes or status >= 500
+
+    def retry_after(self, e: Exception) -> float:
+        headers = getattr(getattr(e, "response", None), "headers", None)
+        value = headers.get("retry-after") if headers is not None else None
+        if value is None:
+            return 0.0
+
+        try:
+            return max(float(value), 0.0)
+        except ValueError:
+            pass
+
+        # HTTP-date form
+        try:
+            retry_at = email.utils.parsedate_to_datetime(value)
+            return max((retry_at - datetime.now(retry_at.tzinfo)).total_seconds(), 0.0)
+        except (TypeError, ValueError):
+            return 0.0
+
+    # implemented by each subclass; Worker can't be an ABC (QRunnable's metaclass isn't ABCMeta)
+    def request(self, chat) -> str:
+        raise TypeError(f"{type(self).__name__} must implement request")
+
+    async def request_async(self, chat, client) -> str:
+        raise TypeError(f"{type(self).__name__} must implement request_async")
+
+    def error_message(self, e: Exception) -> str:
+        self.logger.error(f"Unexpected Error: {e}")
+        return f"Unexpected Error: {e}"
+
+    def emit_chunk(self, text):
+        if text:
+            self.mark_first_byte()
+            self.streamed = True
+            self.signals.chunk.emit(self.request_id, text)
+
+    def emit_result(self, chat, response):
+        self.signals.result.emit(self.result_dict(chat, response))
+
+    def result_dict(self, chat, response) -> dict:
+        def ms(start, end):
+            return round((end - start) * 1000, 1) if start is not None and end is not None else None
+
+        return {
+            'prompt': self.prompt_str if self.prompt_str is not None else self.chart_parser.to_str(chat),
+            'response': response,
+            'model': self.model_key,
+            'datetime': datetime.now().isoformat(),
+            'temperature': self.temp,
+            'request_id': self.request_id,
+            'batch_id': self.batch_id,
+            'cached': self.cached,
+            'error': self.error,
+            'queue_ms': ms(self.t_created, self.t_started),
+            'ttfb_ms': ms(self.t_attempt, self.t_first_byte),
+            'latency_ms': ms(self.t_started, time.monotonic()),
+            'input_tokens': self.input_tokens,
+            'output_tokens': self.output_tokens,
+            'retries': self.attempt,
+        }
 
 class OpenAIWorker(Worker):
-    def __init__(self, prompt,model_key, model_val, openai_client,temp, logger):
-        super().__init__(prompt, model_key, model_val,temp, logger)
+    provider = "openai"
+    stream_usage = True # see Provider.stream_usage
+
+    def __init__(self, prompt,model_key, model_val, openai_client,temp, logger, stream=False):
+        super().__init__(prompt, model_key, model_val,temp, logger, stream)
         self.openai_client = openai_client
 
-    def run(self):
-        chat = self.chart_parser.parse(self.prompt)
-        try:
-            response = self.openai_client.chat.completions.create(
-                messages=chat,
-                model=self.model_val,
-                temperature=self.temp/5,
-            )
-            response = response.choices[0].message.content
-        except openai.RateLimitError as e:
-            response = "Error: You have exceeded your quota. Please check your OpenAI plan and billing details."
+    def request_kwargs(self, chat) -> dict:
+        kwargs = dict(
+            messages=chat,
+            model=self.model_val,
+            temperature=self.temp/5,
+            stream=self.stream,
+        )
+        if self.stream and self.stream_usage:
+            # the last chunk then carries the token usage
+            kwargs["stream_options"] = {"include_usage": True}
+        return kwargs
+
+    def set_openai_usage(self, usage):
+        if usage is not None:
+            self.set_usage(usage.prompt_tokens, usage.completion_tokens)
+
+    def request(self, chat) -> str:
+        response = self.openai_client.chat.completions.create(**self.request_kwargs(chat))
+        if not self.stream:
+            self.set_openai_usage(response.usage)
+            # None for a refusal or a tool call
+            return response.choices[0].message.content or ""
+
+        parts = []
+        for chunk in response:
+            if self.cancelled:
+                break
+            self.set_openai_usage(chunk.usage)
+            if chunk.choices and chunk.choices[0].delta.content:
+                parts.append(chunk.choices[0].delta.content)
+                self.emit_chunk(chunk.choices[0].delta.content)
+        return "".join(parts)
+
+    async def request_async(self, chat, client) -> str:
+        response = await client.chat.completions.create(**self.request_kwargs(chat))
+        if not self.stream:
+            self.set_openai_usage(response.usage)
+            # None for a refusal or a tool call
+            return response.choices[0].message.content or ""
+
+        parts = []
+        async for chunk in response:
+            self.set_openai_usage(chunk.usage)
+            if chunk.choices and chunk.choices[0].delta.content:
+                parts.append(chunk.choices[0].delta.content)
+                self.emit_chunk(chunk.choices[0].delta.content)
+        return "".join(parts)
+
+    def is_retryable(self, e: Exception) -> bool:
+        import openai
+        return isinstance(e, openai.APIConnectionError) or super().is_retryable(e)
+
+    def is_offline(self, e: Exception) -> bool:
+        # a timeout is a slow server, not a missing connection
+        import openai
+        return isinstance(e, openai.APIConnectionError) and not isinstance(e, openai.APITimeoutError)
+
+    def error_message(self, e: Exception) -> str:
+        import openai
+        if isinstance(e, openai.RateLimitError):
             self.logger.error(f"Rate Limit Error: {e}")
-        except openai.APIError as e:
+            return "Error: You have exceeded your quota. Please check your OpenAI plan and billing details."
+        if isinstance(e, openai.APIError):
             self.logger.error(f"API Error: {e}")
-            response = f"API Error: {e.message}"
-        except Exception as e:
-            self.logger.error(f"Unexpected Error: {e}")
-            response = f"Unexpected Error: {e}"
-
-        finally:
-            self.signals.result.emit(
-                {
-                'prompt': self.chart_parser.to_str(chat),
-                'response': response,
-                'model': self.model_key,
-                'datetime': datetime.now().isoformat(),
-                'temperature': self.temp
-                }
-            )
+            return f"API Error: {e.message}"
+        return super().error_message(e)
 
 
 class AnthropicWorker(Worker):
-    def __init__(self, prompt, model_key, model_val, anthropic_client,temp, logger):
-        super().__init__(prompt, model_key, model_val,temp, logger)
+    provider = "anthropic"
+    allow_system = False
+
+    def __init__(self, prompt, model_key, model_val, anthropic_client,temp, logger, stream=False):
+        super().__init__(prompt, model_key, model_val,temp, logger, stream)
         self.anthropic_client = anthropic_client
 
-    def run(self):
-        chat = self.chart_parser.parse(self.prompt, allow_system=False)
-        try:
-            response = self.anthropic_client.messages.create(
-                max_tokens=2048,
-                system='user',
-                messages=chat,
-                model=self.model_val,
-                temperature=self.temp/10
-            )
-            response = response.content[0].text
-        except anthropic.APIConnectionError as e:
+    def request_kwargs(self, chat) -> dict:
+        return dict(
+            max_tokens=2048,
+            system='user',
+            messages=chat,
+            model=self.model_val,
+            temperature=self.temp/10
+        )
+
+    def request(self, chat) -> str:
+        if not self.stream:
+            response = self.anthropic_client.messages.create(**self.request_kwargs(chat))
+            self.set_usage(response.usage.input_tokens, response.usage.output_tokens)
+            return response.content[0].text
+
+        parts = []
+        with self.anthropic_client.messages.stream(**self.request_kwargs(chat)) as stream:
+            for text in stream.text_stream:
+                if self.cancelled:
+                    break
+                parts.append(text)
+                self.emit_chunk(text)
+            if not self.cancelled:
+                usage = stream.get_final_message().usage
+                self.set_usage(usage.input_tokens, usage.output_tokens)
+        return "".join(parts)
+
+    async def request_async(self, chat, client) -> str:
+        if not self.stream:
+            response = await client.messages.create(**self.request_kwargs(chat))
+            self.set_usage(response.usage.input_tokens, response.usage.output_tokens)
+            return response.content[0].text
+
+        parts = []
+        async with client.messages.stream(**self.request_kwargs(chat)) as stream:
+            async for text in stream.text_stream:
+                parts.append(text)
+                self.emit_chunk(text)
+            usage = (await stream.get_final_message()).usage
+            self.set_usage(usage.input_tokens, usage.output_tokens)
+        return "".join(parts)
+
+    def is_retryable(self, e: Exception) -> bool:
+        import anthropic
+        return isinstance(e, anthropic.APIConnectionError) or super().is_retryable(e)
+
+    def is_offline(self, e: Exception) -> bool:
+        import anthropic
+        return isinstance(e, anthropic.APIConnectionError) and not isinstance(e, anthropic.APITimeoutError)
+
+    def error_message(self, e: Exception) -> str:
+        import anthropic
+        if isinstance(e, anthropic.APIConnectionError):
             self.logger.error(f"API Connection Error: {e}")
-            response = f"API Connection Error: {e}"
-        except anthropic.RateLimitError as e:
+            return f"API Connection Error: {e}"
+        if isinstance(e, anthropic.RateLimitError):
             self.logger.error(f"Rate Limit Error: {e}")
-            response = f"Rate Limit Error: {e}"
-        except anthropic.APIStatusError as e:
+            return f"Rate Limit Error: {e}"
+        if isinstance(e, anthropic.APIStatusError):
             self.logger.error(f"API Status Error: {e}")
-            response = f"API Status Error: {e}"
-        except Exception as e:
-            self.logger.error(f"Unexpected Error: {e}")
-            response = f"Unexpected Error: {e}"
-
-        finally:
-            self.signals.result.emit(
-                {
-                'prompt': self.chart_parser.to_str(chat),
-                'response': response,
-                'model': self.model_key,
-                'datetime': datetime.now().isoformat(),
-                'temperature': self.temp
-                }
-            )
+            return f"API Status Error: {e}"
+        return super().error_message(e)
 
 
 class PerplexityWorker(Worker):
+    provider = "perplexity"
+    url = "https://api.perplexity.ai/chat/completions"
 
-    def __init__(self, prompt, model_key, model_val, perplexity_client, temp, logger):
-        super().__init__(prompt, model_key, model_val, temp, logger)
+    def __init__(self, prompt, model_key, model_val, perplexity_client, temp, logger, stream=False):
+        super().__init__(prompt, model_key, model_val, temp, logger, stream)
         self.perplexity_client = perplexity_client
 
-    def run(self):
-        url = "https://api.perplexity.ai/chat/completions"
-        chat = self.chart_parser.parse(self.prompt)
+    def request_kwargs(self, chat, api_key) -> dict:
         payload = {
             "model": self.model_val,
             "messages": chat,
@@ -130,53 +460,111 @@ class PerplexityWorker(Worker):
             "return_related_questions": True,
             "search_recency_filter": "month",
             "top_k": 0,
-            "stream": False,
+            "stream": self.stream,
             "presence_penalty": 0,
             "frequency_penalty": 1
         }
         headers = {
-            "Authorization": f"Bearer {self.perplexity_client.api_key}",
+            "Authorization": f"Bearer {api_key}",
             "Content-Type": "application/json"
         }
+        self.logger.debug(payload)
+        return dict(json=payload, headers=headers)
 
-        try:
-            print(payload)
-            response = requests.request("POST", url, json=payload, headers=headers)
-            print(response.text)
+    def request(self, chat) -> str:
+        http_client = self.perplexity_client.http_client
+        kwargs = self.request_kwargs(chat, self.perplexity_client.api_key)
 
-            # analyze the response (json format)
-            response = response.json()
-            response = response['choices'][0]['message']['content']
+        if not self.stream:
+            response = http_client.post(self.url, **kwargs)
+            self.logger.debug(response.text)
+            response.raise_for_status()
+            return self.parse_response(response.json())
 
-        except requests.exceptions.RequestException as e:
-            self.logger.error(f"Request Error: {e}")
-            response = f"Request Error: {e}"
+        parts = []
+        with http_client.stream("POST", self.url, **kwargs) as response:
+            response.raise_for_status()
+            for line in response.iter_lines():
+                if self.cancelled:
+                    break
+                text = self.parse_event(line)
+                if text is None:
+                    break
+                if text:
+                    parts.append(text)
+                    self.emit_chunk(text)
+        return "".join(parts)
 
-        except requests.exceptions.HTTPError as e:
-            self.logger.error(f"HTTP Error: {e}")
-            response = f"HTTP Error: {e}"
+    async def request_async(self, chat, client) -> str:
+        kwargs = self.request_kwargs(chat, self.perplexity_client.api_key)
 
-        # json error
-        except ValueError as e:
-            self.logger.error(f"JSON Error: {e}")
-            response = f"JSON Error: {e}"
+        if not self.stream:
+            response = await client.post(self.url, **kwargs)
+            self.logger.debug(response.text)
+            response.raise_for_status()
+            return self.parse_response(response.json())
 
-        except KeyError as e:
-            self.logger.error(f"Key Error: {e}")
-            response = f"Key Error: {e}"
+        parts = []
+        async with client.stream("POST", self.url, **kwargs) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                text = self.parse_event(line)
+                if text is None:
+                    break
+                if text:
+                    parts.append(text)
+                    self.emit_chunk(text)
+        return "".join(parts)
 
-        except Exception as e:
-            self.logger.error(f"Unexpected Error: {e}")
-            response = f"Unexpected Error: {e}"
+    def parse_response(self, response: dict) -> str:
+        # analyze the response (json format)
+        self.parse_usage(response)
+        return response['choices'][0]['message']['content']
 
-        finally:
-            self.signals.result.emit(
-                {
-                'prompt': self.chart_parser.to_str(chat),
-                'response': response,
-                'model': self.model_key,
-                'datetime': datetime.now().isoformat(),
-                'temperature': self.temp
-                }
-            )
+    def parse_usage(self, data: dict):
+        usage = data.get('usage')
+        if usage:
+            self.set_usage(usage.get('prompt_tokens'), usage.get('completion_tokens'))
+
+    def parse_event(self, line: str):
+        """
+        Parse one line of the server-sent events stream.
+
+        Returns the text delta ("" for lines without text) or None at "data: [DONE]".
+        """
+        if not line.startswith("data:"):
+            return ""
+        data = line[len("data:"):].strip()
+        if data == "[DONE]":
+            return None
+        event = json.loads(data)
+        # every event carries the usage so far
+        self.parse_usage(event)
+        if not event.get('choices'):
+            return ""
+        return event['choices'][0].get('delta', {}).get('content') or ""
+
+    def is_retryable(self, e: Exception) -> bool:
+        import httpx
+        return isinstance(e, httpx.TransportError) or super().is_retryable(e)
+
+    def is_offline(self, e: Exception) -> bool:
+        import httpx
+        return isinstance(e, httpx.ConnectError)
 
+    def error_message(self, e: Exception) -> str:
+        import httpx
+        if isinstance(e, httpx.HTTPStatusError):
+            self.logger.error(f"HTTP Error: {e}")
+            return f"HTTP Error: {e}"
+        if isinstance(e, httpx.HTTPError):
+            self.logger.error(f"Request Error: {e}")
+            return f"Request Error: {e}"
+        # json error
+        if isinstance(e, ValueError):
+            self.logger.error(f"JSON Error: {e}")
+            return f"JSON Error: {e}"
+        if isinstance(e, KeyError):
+            self.logger.error(f"Key Error: {e}")
+            return f"Key Error: {e}"
+        return super().error_message(e)
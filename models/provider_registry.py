@@ -0,0 +1,103 @@
+from dataclasses import dataclass, field
+from logging import Logger
+from typing import Dict, List
+
+from models.config_manager import Config
+from models.llm_client_worker import Worker, OpenAIWorker, AnthropicWorker, PerplexityWorker
+
+# API flavour ("type" in config.json) -> worker class implementing its requests and streaming
+worker_classes = {
+    "openai": OpenAIWorker,
+    "anthropic": AnthropicWorker,
+    "perplexity": PerplexityWorker,
+}
+
+@dataclass
+class Provider:
+    name: str # key of rate_limits / timeouts in config.json
+    type: str # key of worker_classes
+    models: Dict[str, str] = field(default_factory=dict) # display name -> model id
+    api_key_env: str = None
+    base_url: str = None # None for the provider's own endpoint
+    max_concurrency: int = None # requests in flight, None = the global max_concurrency
+    stream_usage: bool = True # "openai" type: ask for the token usage when streaming (stream_options), not all servers accept it
+
+    @property
+    def worker_class(self) -> type:
+        return worker_classes[self.type]
+
+
+class ProviderRegistry:
+    """
+    All configured providers and an index from model name to provider.
+
+    The built-in providers come from openai_models / anthropic_models /
+    perplexity_models; the "providers" section of config.json adds more,
+    e.g. OpenAI-compatible servers (vLLM, Ollama, gateways) by base_url.
+    """
+    def __init__(self, config: Config, logger: Logger):
+        self.logger = logger
+        self.providers: Dict[str, Provider] = {}
+        self.model_index: Dict[str, Provider] = {}
+
+        self.add(Provider("openai", "openai", config.openai_models or {}, "OPENAI_API_KEY"))
+        self.add(Provider("anthropic", "anthropic", config.anthropic_models or {}, "ANTHROPIC_API_KEY"))
+        self.add(Provider("perplexity", "perplexity", config.perplexity_models or {}, "PERPLEXITY_API_KEY"))
+
+        for name, spec in (config.providers or {}).items():
+            if spec.get("type", "openai") not in worker_classes:
+                self.logger.error(f"Provider '{name}': unknown type '{spec['type']}', expected one of {list(worker_classes)}")
+                continue
+            self.add(Provider(
+                name,
+                spec.get("type", "openai"),
+                spec.get("models", {}),
+                spec.get("api_key_env"),
+                spec.get("base_url"),
+                spec.get("max_concurrency"),
+                # OpenAI's own endpoint accepts it, other servers only if configured so
+                spec.get("stream_usage", not spec.get("base_url")),
+            ))
+
+    def add(self, provider: Provider):
+        if not provider.models:
+            return
+        self.providers[provider.name] = provider
+        for model in provider.models:
+            if model in self.model_index:
+                self.logger.warning(f"Model '{model}' of '{provider.name}' is already provided by '{self.model_index[model].name}', ignored")
+                continue
+            self.model_index[model] = provider
+
+    def get(self, name: str) -> Provider:
+        return self.providers.get(name)
+
+    def provider_for(self, model: str) -> Provider:
+        return self.model_index.get(model)
+
+    def model_names(self) -> List[str]:
+        return list(self.model_index)
+
+    def concurrency_limits(self) -> Dict[str, int]:
+        return {name: p.max_concurrency for name, p in self.providers.items() if p.max_concurrency}
+
+    def create_worker(self, clients, prompt: str, model: str, temperature: int, logger: Logger, stream: bool = False) -> Worker:
+        """Return a worker for the model (None if unknown), creating the provider's client on first use."""
+        provider = self.provider_for(model)
+        if provider is None:
+            logger.error(f"Model not found: {model}")
+            return None
+
+        worker = provider.worker_class(
+            prompt,
+            model,
+            provider.models[model],
+            clients.get_client(provider.name),
+            temperature,
+            logger,
+            stream
+            )
+        # queues, rate limits, timeouts and pools are per provider, not per API flavour
+        worker.provider = provider.name
+        worker.stream_usage = provider.stream_usage
+        return worker
@@ -0,0 +1,158 @@
+import time
+import random
+from collections import deque
+from logging import Logger
+from typing import Callable, Deque, Dict, Set
+from PySide6.QtCore import QObject, QTimer, Slot
+
+from models.llm_client_worker import Worker
+
+
+class TokenBucket:
+    """
+    Refills continuously at rate_per_minute / 60 per second, up to one minute's budget.
+
+    A rate of 0 (or None) means unlimited.
+    """
+    def __init__(self, rate_per_minute):
+        self.rate = (rate_per_minute or 0) / 60
+        self.capacity = rate_per_minute or 0
+        self.tokens = self.capacity
+        self.last = time.monotonic()
+
+    def refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.last) * self.rate)
+        self.last = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until `amount` can be consumed (0 if available now)."""
+        if not self.rate:
+            return 0.0
+        self.refill(now)
+        # a single request larger than the whole budget only waits for a full bucket
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def consume(self, amount: float):
+        if self.rate:
+            self.tokens -= min(amount, self.capacity)
+
+
+def backoff(attempt: int, base_delay: float, max_delay: float) -> float:
+    """Seconds before retry number `attempt`, with full jitter: uniform in [0, min(max_delay, base_delay * 2^attempt)]."""
+    return random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+
+
+class RequestScheduler(QObject):
+    """
+    Sits between the controller and the thread pool / async engine.
+
+    Each provider has a requests-per-minute and a tokens-per-minute bucket,
+    and optionally a limit on the requests in flight; requests that don't
+    fit are queued (in order) until the buckets refill or a request finishes.
+    Workers that fail with a retryable error (429, 5xx, connection errors)
+    come back through retry() and are resubmitted after the server's
+    Retry-After, or after a jittered exponential backoff.
+    """
+    def __init__(self, rate_limits: dict, retry: dict, start_worker: Callable[[Worker], None], logger: Logger, concurrency_limits: dict = None):
+        super().__init__()
+        self.start_worker = start_worker
+        self.logger = logger
+
+        self.max_retries = retry.get("max_retries", 5)
+        self.base_delay = retry.get("base_delay", 1.0)
+        self.max_delay = retry.get("max_delay", 60.0)
+
+        self.request_buckets: Dict[str, TokenBucket] = {}
+        self.token_buckets: Dict[str, TokenBucket] = {}
+        for provider, limits in rate_limits.items():
+            self.request_buckets[provider] = TokenBucket(limits.get("requests_per_minute"))
+            self.token_buckets[provider] = TokenBucket(limits.get("tokens_per_minute"))
+
+        self.queues: Dict[str, Deque[Worker]] = {}
+
+        # provider -> max requests in flight, and the workers running now
+        self.concurrency_limits = concurrency_limits or {}
+        self.running: Dict[str, Set[Worker]] = {}
+
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self.drain)
+
+    def n_queued(self) -> int:
+        return sum(len(queue) for queue in self.queues.values())
+
+    def submit(self, worker: Worker):
+        worker.max_retries = self.max_retries
+        worker.signals.retry.connect(lambda request_id, retry_after, w=worker: self.retry(w, retry_after))
+        self.enqueue(worker)
+
+    def enqueue(self, worker: Worker):
+        if worker.cancelled:
+            return
+        self.queues.setdefault(worker.provider, deque()).append(worker)
+        self.drain()
+
+    def cancel(self, worker: Worker):
+        queue = self.queues.get(worker.provider)
+        if queue is not None and worker in queue:
+            queue.remove(worker)
+        self.finished(worker)
+
+    def finished(self, worker: Worker):
+        """Free the worker's slot once it has returned (result, retry or cancel)."""
+        running = self.running.get(worker.provider)
+        if running is not None and worker in running:
+            running.discard(worker)
+            self.drain()
+
+    @staticmethod
+    def estimate_tokens(worker: Worker) -> int:
+        # rough estimate of the input tokens (~4 characters per token)
+        return len(worker.prompt) // 4 + 1
+
+    @Slot()
+    def drain(self):
+        now = time.monotonic()
+        next_wait = None
+
+        for provider, queue in self.queues.items():
+            request_bucket = self.request_buckets.get(provider)
+            token_bucket = self.token_buckets.get(provider)
+            limit = self.concurrency_limits.get(provider)
+            running = self.running.setdefault(provider, set())
+
+            while queue:
+                # no timer needed: finished() drains again
+                if limit and len(running) >= limit:
+                    break
+
+                worker = queue[0]
+                tokens = self.estimate_tokens(worker)
+                wait = 0.0
+                if request_bucket is not None:
+                    wait = max(request_bucket.wait_time(1, now), token_bucket.wait_time(tokens, now))
+
+                if wait > 0:
+                    next_wait = wait if next_wait is None else min(next_wait, wait)
+                    break
+
+                if request_bucket is not None:
+                    request_bucket.consume(1)
+                    token_bucket.consume(tokens)
+                queue.popleft()
+                running.add(worker)
+                self.start_worker(worker)
+
+        if next_wait is not None:
+            self.logger.debug(f"{self.n_queued()} request(s) queued, next in {next_wait:.2f}s")
+            if not self.timer.isActive() or self.timer.remainingTime() > next_wait * 1000:
+                self.timer.start(int(next_wait * 1000) + 1)
+
+    def retry(self, worker: Worker, retry_after: float):
+        self.finished(worker)
+        delay = retry_after if retry_after > 0 else backoff(worker.attempt, self.base_delay, self.max_delay)
+        self.logger.warning(f"Retrying {worker.model_key} (attempt {worker.attempt}/{worker.max_retries}) in {delay:.1f}s")
+        QTimer.singleShot(int(delay * 1000), lambda: self.enqueue(worker))
@@ -0,0 +1,110 @@
+import sqlite3
+import hashlib
+import json
+import time
+from pathlib import Path
+from typing import List, Dict
+
+
+class ResponseCache:
+    """
+    SQLite-backed cache of responses keyed on (provider, model id, temperature, parsed chat):
+    providers serving the same model id (e.g. a gateway and OpenAI) don't share entries.
+
+    Entries older than max_age_days are never served, and the least recently
+    used entries are evicted once the cache holds more than max_entries.
+    """
+    def __init__(self, logger, db_path, max_entries: int = 1000, max_age_days: float = 30):
+        self.logger = logger
+        self.db_name = Path(db_path)
+        self.max_entries = max_entries
+        self.max_age = max_age_days * 24 * 60 * 60
+        self.hits = 0
+        self.misses = 0
+        self.conn = None
+
+        try:
+            self.conn = sqlite3.connect(self.db_name)
+            # a lost cache entry is harmless, so don't pay for an fsync on every hit
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS cache (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                response TEXT NOT NULL,
+                created REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+            """)
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_cache_last_access ON cache (last_access)")
+            self.conn.commit()
+        except sqlite3.Error as e:
+            self.logger.error(f"Error opening response cache: {e}")
+            self.conn = None
+
+    @staticmethod
+    def make_key(chat: List[Dict], provider: str, model: str, temperature) -> str:
+        # whitespace around the messages doesn't change the request
+        normalized = [{"role": m["role"], "content": m["content"].strip()} for m in chat]
+        data = json.dumps([provider, model, temperature, normalized], ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+    def get(self, key: str):
+        """Return the cached response for the key, or None."""
+        if self.conn is None:
+            return None
+
+        now = time.time()
+        try:
+            row = self.conn.execute(
+                "SELECT response FROM cache WHERE key = ? AND created >= ?",
+                (key, now - self.max_age),
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+
+            self.conn.execute("UPDATE cache SET last_access = ? WHERE key = ?", (now, key))
+            self.conn.commit()
+            self.hits += 1
+            return row[0]
+        except sqlite3.Error as e:
+            self.logger.error(f"Error reading response cache: {e}")
+            return None
+
+    def put(self, key: str, model: str, response: str):
+        if self.conn is None:
+            return
+
+        now = time.time()
+        try:
+            with self.conn:
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO cache (key, model, response, created, last_access) VALUES (?, ?, ?, ?, ?)",
+                    (key, model, response, now, now),
+                )
+                self.evict(now)
+        except sqlite3.Error as e:
+            self.logger.error(f"Error writing response cache: {e}")
+
+    def evict(self, now: float):
+        self.conn.execute("DELETE FROM cache WHERE created < ?", (now - self.max_age,))
+        self.conn.execute(
+            """
+            DELETE FROM cache WHERE key IN (
+                SELECT key FROM cache ORDER BY last_access DESC LIMIT -1 OFFSET ?
+            )
+            """,
+            (self.max_entries,),
+        )
+
+    def clear(self):
+        if self.conn is None:
+            return
+        with self.conn:
+            self.conn.execute("DELETE FROM cache")
+
+    def close(self):
+        if self.conn:
+            self.conn.close()
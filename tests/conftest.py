@@ -0,0 +1,8 @@
+import os
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PySide6.QtWidgets import QApplication
+
+# one application for the whole run: the widget tests need a QApplication, which
+# can't be created once another module has made a bare QCoreApplication
+app = QApplication.instance() or QApplication([])
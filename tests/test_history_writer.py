@@ -0,0 +1,46 @@
+"""HistoryWriter: a failing write fails alone, the writer thread keeps going."""
+import time
+import logging
+
+import pytest
+from PySide6.QtCore import QCoreApplication
+
+from models.database_manager import DatabaseManager
+from models.llm_client_worker import LLMResults
+
+app = QCoreApplication.instance() or QCoreApplication([])
+
+def wait_for(results):
+    deadline = time.monotonic() + 5
+    while not results and time.monotonic() < deadline:
+        app.processEvents()
+        time.sleep(0.001)
+    assert results, "write not done"
+    return results[0]
+
+@pytest.fixture
+def db(tmp_path):
+    db = DatabaseManager(logging.getLogger(__name__), tmp_path / "history.db")
+    yield db
+    db.close()
+
+def test_failing_write_fails_alone(db):
+    def fail(cursor):
+        raise TypeError("not a database error")
+
+    failed, ids = [], []
+    db.writer.submit(fail, failed.append)
+    db.insert_history(LLMResults(prompt="question", response="answer", model="model", datetime="2026-01-01 00:00:00"), ids.append)
+    assert wait_for(ids)
+    assert failed == [None]
+
+    # the writer thread is still there
+    later = []
+    db.insert_history(LLMResults(prompt="question", response="again", model="model", datetime="2026-01-01 00:00:01"), later.append)
+    assert wait_for(later)
+
+def test_none_response_stored_empty(db):
+    ids = []
+    db.insert_history(LLMResults(prompt="question", response=None, model="model", datetime="2026-01-01 00:00:00"), ids.append)
+    item = db.get_one_item(wait_for(ids)[0])
+    assert item.response == ""
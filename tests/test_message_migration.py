@@ -0,0 +1,47 @@
+"""Prompts of a history written before the messages table are rebuilt exactly once moved into it."""
+import sqlite3
+import logging
+
+import pytest
+
+from models.database_manager import DatabaseManager
+
+prompts = [
+    "[USER]: def f():\n    return 1  \n",
+    "[USER]:   indented question\n#-----#\n[ASSISTANT]:  answer after two spaces\n\n    code\n#-----#\n[USER]: follow-up \n",
+    "[SYSTEM]: be brief\n#-----#\n[USER]: hello\n",
+    "not in the chat format\n",
+]
+
+@pytest.fixture
+def old_db(tmp_path):
+    path = tmp_path / "history.db"
+    conn = sqlite3.connect(path)
+    # the history table before any column was added
+    conn.execute("""
+    CREATE TABLE history (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        query TEXT NOT NULL,
+        response TEXT NOT NULL,
+        datetime TEXT NOT NULL,
+        model TEXT NOT NULL,
+        temperature INTEGER
+    )
+    """)
+    conn.executemany(
+        "INSERT INTO history (query, response, datetime, model, temperature) VALUES (?, 'answer', ?, 'model', 0)",
+        [(prompt, f"2024-01-0{i + 1}00:00:00") for i, prompt in enumerate(prompts)],
+    )
+    conn.commit()
+    conn.close()
+    return path
+
+def test_migrated_prompts_are_unchanged(old_db):
+    db = DatabaseManager(logging.getLogger(__name__), old_db)
+    try:
+        db.cursor.execute("SELECT COUNT(*) FROM history WHERE message_id IS NOT NULL")
+        assert db.cursor.fetchone()[0] == 3
+        for id, prompt in enumerate(prompts, 1):
+            assert db.get_one_item(id).prompt == prompt
+    finally:
+        db.close()
@@ -0,0 +1,85 @@
+"""The request outbox of DatabaseManager: status changes and results stored once."""
+import time
+import logging
+
+import pytest
+from PySide6.QtCore import QCoreApplication
+
+from models.database_manager import DatabaseManager
+from models.llm_client_worker import LLMResults
+
+app = QCoreApplication.instance() or QCoreApplication([])
+
+def wait_for(results):
+    deadline = time.monotonic() + 5
+    while not results and time.monotonic() < deadline:
+        app.processEvents()
+        time.sleep(0.001)
+    assert results, "write not done"
+    return results[0]
+
+def flush(db):
+    """Wait for the writes submitted so far (the writer runs them in order)."""
+    results = []
+    db.writer.submit(lambda cursor: True, results.append)
+    wait_for(results)
+
+def insert(db, result):
+    ids = []
+    db.insert_history(result, ids.append)
+    return wait_for(ids)[0]
+
+def statuses(db):
+    db.cursor.execute("SELECT request_id, status FROM requests")
+    return dict(db.cursor.fetchall())
+
+def result(request_id, response="answer", error=False):
+    return LLMResults(prompt="question", response=response, model="model", datetime="2026-01-01 00:00:00", request_id=request_id, error=error)
+
+@pytest.fixture
+def db(tmp_path):
+    db = DatabaseManager(logging.getLogger(__name__), tmp_path / "history.db")
+    yield db
+    db.close()
+
+def test_status_changes(db):
+    for request_id in ("a", "b", "c"):
+        db.add_request(request_id, None, "question", "model", 0)
+    flush(db)
+    assert statuses(db) == {"a": "pending", "b": "pending", "c": "pending"}
+    assert [r.request_id for r in db.get_open_requests()] == ["a", "b", "c"]
+
+    db.set_request_status("a", "in_flight")
+    db.set_request_status("b", "in_flight")
+    flush(db)
+    assert statuses(db) == {"a": "in_flight", "b": "in_flight", "c": "pending"}
+
+    insert(db, result("a"))
+    insert(db, result("b", error=True))
+    assert statuses(db) == {"a": "done", "b": "failed", "c": "pending"}
+    assert [r.request_id for r in db.get_open_requests()] == ["c"]
+
+    # answered requests keep their status
+    db.set_request_status("a", "pending")
+    flush(db)
+    assert statuses(db)["a"] == "done"
+
+def test_duplicate_completion_stored_once(db):
+    db.add_request("a", None, "question", "model", 0)
+    first = insert(db, result("a"))
+    again = insert(db, result("a", response="answer, sent again"))
+    assert again == first
+    db.cursor.execute("SELECT COUNT(*) FROM history")
+    assert db.cursor.fetchone()[0] == 1
+
+def test_completion_after_delete_stored_again(db):
+    db.add_request("a", None, "question", "model", 0)
+    first = insert(db, result("a"))
+    deleted = []
+    db.delete_history(first, deleted.append)
+    wait_for(deleted)
+
+    # not the id of the deleted row (which SQLite may reuse, so compare the rows)
+    again = insert(db, result("a", response="answer, sent again"))
+    assert db.get_one_item(again).response == "answer, sent again"
+    assert statuses(db)["a"] == "done"
@@ -126,6 +126,8 @@ Keep the config.json file in the same directory as the app.
 - Focus to input area: Ctrl+L
 - Model radio buttons: Ctrl+Alt+1, Ctrl+Alt+2, ...
 - Send button: Ctrl+Return
+- Send without the response cache: Ctrl+Shift+Return
+- Cancel the running requests: Esc
 - Append button: Alt+Return
 - Zoom in: Ctrl++
 - Zoom out: Ctrl+-
@@ -142,4 +144,14 @@ loading_message = """
 <h1>Loading...</h1>
 <p>Fetching the response from the API. This may take a few seconds.</p>
 </font>
-"""
\ No newline at end of file
+"""
+cancel_message = "Cancelled"
+
+offline_message = """
+<font color='gray'>
+<h1>Offline</h1>
+<p>The request is queued and will be sent when the connection is back.</p>
+</font>
+"""
+
+timeout_message = "Timeout: no response within {} seconds"
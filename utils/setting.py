@@ -4,13 +4,29 @@ version = "0.4.0"
 json_path = "config.json"
 window_geometry = (50, 50, 1200, 950)
 db_path = "llm_client.db"
+cache_db_path = "llm_cache.db"
+compress_threshold = 4096 # characters; longer prompts / responses are stored zlib-compressed
 log_path = Path("log/llm_app.log")
 deliminator = '#-----#'
 window_title = f"myLLM  v{version}"
-n_history = 100
+n_history = 100 # rows per page of the history panel
+history_preview_length = 200 # characters of the prompt / response stored for the history list
 log_backup_count = 3
 log_max_bytes = 1000000
 search_delay = 150
+history_update_interval = 100 # ms, rows written within it are added to the history list together
+search_rank_window = 1000 # words matching more rows than this are too common to rank by BM25: newest first
+search_snippet_tokens = 32 # characters around the match in history search results (trigram tokens)
+snippet_start = "\x02" # marks the matched text in snippets, replaced by highlighting in the history panel
+snippet_end = "\x03"
+outbox_retry_interval = 30 # s, how often requests waiting for the connection are sent again
+outbox_write_timeout = 5 # s, a request whose outbox row isn't written by then is sent without it
+outbox_keep_days = 7 # answered requests are removed from the outbox after this many days
+stream_render_interval = 50 # ms, how often streamed chunks are flushed to the output area
+render_cache_size = 64 * 1024 * 1024 # bytes (estimated) of history items kept rendered for the output area
+render_prefetch = 3 # history rows rendered ahead of the selected one
+markdown_chunk_threshold = 50000 # characters; longer Markdown is shown in chunks, the first one at once
+markdown_chunk_size = 8000 # characters of Markdown parsed per event loop turn
 n_prompt_buttons = 5
 response_prefix = "[ASSISTANT]:"
 user_prefix = "[USER]:"
@@ -0,0 +1,41 @@
+import time
+import threading
+
+
+class StartupProfile:
+    """
+    Timeline of the app startup, logged once the deferred steps are done
+    (enabled with the --startup-profile argument).
+
+    start is a time.perf_counter() taken before the heavy imports; `pending`
+    names the marks that complete the startup (they may come from other threads).
+    """
+    def __init__(self, logger, start: float, enabled: bool, pending=()):
+        self.logger = logger
+        self.start = start
+        self.enabled = enabled
+        self.pending = set(pending)
+        self.marks = []
+        self.reported = False
+        self.lock = threading.Lock()
+
+    def mark(self, name: str):
+        if not self.enabled:
+            return
+
+        with self.lock:
+            self.marks.append((name, time.perf_counter() - self.start))
+            self.pending.discard(name)
+            report = not self.pending and not self.reported
+            self.reported = self.reported or report
+
+        if report:
+            self.report()
+
+    def report(self):
+        lines = ["Startup profile:"]
+        last = 0.0
+        for name, elapsed in self.marks:
+            lines.append(f"  {elapsed * 1000:8.1f} ms  (+{(elapsed - last) * 1000:7.1f} ms)  {name}")
+            last = elapsed
+        self.logger.info("\n".join(lines))
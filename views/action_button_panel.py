@@ -5,6 +5,7 @@ from PySide6.QtGui import QIcon
 class ActionButtonsPanel(QWidget):
     send_signal = Signal()
     append_signal = Signal()
+    cancel_signal = Signal()
 
 
     def __init__(self, parent=None):
@@ -26,6 +27,13 @@ class ActionButtonsPanel(QWidget):
         self.append_button.clicked.connect(self.append_signal.emit)
         self.layout.addWidget(self.append_button)
 
+        self.cancel_button = QPushButton()
+        cancel_icon = QIcon.fromTheme("process-stop")
+        self.cancel_button.setIcon(cancel_icon)
+        self.cancel_button.setText("Cancel (Esc)")
+        self.cancel_button.clicked.connect(self.cancel_signal.emit)
+        self.layout.addWidget(self.cancel_button)
+
     def disable_buttons(self):
         self.send_button.setEnabled(False)
         self.append_button.setEnabled(False)
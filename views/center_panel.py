@@ -1,16 +1,20 @@
-from PySide6.QtWidgets import QWidget, QVBoxLayout, QSplitter
-from PySide6.QtCore import Qt
+from PySide6.QtWidgets import QWidget, QVBoxLayout, QTabWidget, QToolButton
+from PySide6.QtCore import Signal
 
-from views.prompt_input_panel import PromptInputPanel
-from views.output_area import OutputArea
+from views.session_panel import SessionPanel
 
 from models.config_manager import Config
 
 from utils.setting import spacing
-import utils.messages as messages
 
 
 class CenterPanel(QWidget):
+    """
+    Sessions in tabs, each with its own input and output. input_panel,
+    output_area and compare_panel are those of the current tab.
+    """
+    session_added = Signal(object)
+
     def __init__(self, config:Config, logger):
         super().__init__()
         self.layout = QVBoxLayout(self)
@@ -22,26 +26,63 @@ class CenterPanel(QWidget):
         self.prompts = self.config.prompts
 
         self.logger = logger
+        self.n_sessions = 0
         self.init_ui()
-        self.output_area.set_text(messages.welcome_message, style=True)
+        self.new_session()
 
     def init_ui(self):
-        splitter = QSplitter(Qt.Vertical)
+        self.tabs = QTabWidget()
+        self.tabs.setTabsClosable(True)
+        self.tabs.setMovable(True)
+        self.tabs.setDocumentMode(True)
+
+        new_button = QToolButton()
+        new_button.setText("+")
+        new_button.setToolTip("New session (Ctrl+T)")
+        new_button.clicked.connect(self.new_session)
+        self.tabs.setCornerWidget(new_button)
+
+        self.layout.addWidget(self.tabs)
+
+    def new_session(self) -> SessionPanel:
+        self.n_sessions += 1
+        panel = SessionPanel(self.prompts)
+        self.session_added.emit(panel)
+        self.tabs.setCurrentIndex(self.tabs.addTab(panel, f"Session {self.n_sessions}"))
+        panel.input_panel.textarea.setFocus()
+        return panel
+
+    def close_session(self, panel:SessionPanel):
+        # the last tab stays
+        if self.tabs.count() == 1:
+            panel.clear_textboxes()
+            return
+        self.tabs.removeTab(self.tabs.indexOf(panel))
+        panel.deleteLater()
+
+    def sessions(self):
+        return [self.tabs.widget(i) for i in range(self.tabs.count())]
+
+    def current_session(self) -> SessionPanel:
+        return self.tabs.currentWidget()
+
+    @property
+    def input_panel(self):
+        return self.current_session().input_panel
 
-        # Prompt input
-        self.input_panel = PromptInputPanel(self.prompts)
+    @property
+    def output_area(self):
+        return self.current_session().output_area
 
-        # Output area
-        self.output_area = OutputArea()
+    @property
+    def compare_panel(self):
+        return self.current_session().compare_panel
 
-        splitter.addWidget(self.input_panel)
-        splitter.addWidget(self.output_area)
-        splitter.setSizes([300, 500])
-        self.layout.addWidget(splitter)
+    def show_output_area(self):
+        self.current_session().show_output_area()
 
+    def show_compare_panel(self, panes):
+        self.current_session().show_compare_panel(panes)
 
     def clear_textboxes(self):
-        self.input_panel.clear_text()
-        self.output_area.text_edit.clear()
-        self.output_area.set_text(messages.welcome_message, style=True)
-        self.input_panel.textarea.setFocus()
\ No newline at end of file
+        self.current_session().clear_textboxes()
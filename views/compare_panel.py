@@ -0,0 +1,56 @@
+from PySide6.QtWidgets import QWidget, QVBoxLayout, QHBoxLayout, QSplitter, QLabel
+from PySide6.QtCore import Qt
+from typing import Dict, List, Tuple
+
+from views.output_area import OutputArea
+import utils.messages as messages
+
+
+class ComparePanel(QWidget):
+    """Side-by-side output areas, one per model of a fan-out send."""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.layout = QHBoxLayout(self)
+        self.layout.setContentsMargins(0, 0, 0, 0)
+        self.splitter = None
+
+        # request id -> output area / final response
+        self.panes: Dict[str, OutputArea] = {}
+        self.responses: Dict[str, str] = {}
+
+    def set_panes(self, panes: List[Tuple[str, str]]):
+        """Create one pane per (request_id, model name), showing the loading message."""
+        if self.splitter is not None:
+            self.splitter.deleteLater()
+        self.panes = {}
+        self.responses = {}
+
+        self.splitter = QSplitter(Qt.Horizontal)
+        for request_id, model in panes:
+            pane = QWidget()
+            layout = QVBoxLayout(pane)
+            layout.setContentsMargins(0, 0, 0, 0)
+            layout.addWidget(QLabel(model))
+
+            output_area = OutputArea()
+            output_area.text_edit.setHtml(messages.loading_message)
+            layout.addWidget(output_area)
+
+            self.splitter.addWidget(pane)
+            self.panes[request_id] = output_area
+
+        self.layout.addWidget(self.splitter)
+
+    def pane(self, request_id: str) -> OutputArea:
+        return self.panes.get(request_id)
+
+    def set_result(self, request_id: str, response: str, style: bool):
+        if request_id not in self.panes:
+            return
+        self.responses[request_id] = response
+        self.panes[request_id].set_text(response, style)
+
+    def restyle(self, style: bool):
+        for request_id, response in self.responses.items():
+            self.panes[request_id].set_text(response, style)
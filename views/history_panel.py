@@ -1,13 +1,196 @@
-from PySide6.QtWidgets import (QWidget, QVBoxLayout, QTableWidget, QTableWidgetItem, QScrollArea, QHeaderView, QHBoxLayout, QLineEdit)
-from PySide6.QtCore import Signal, Qt
-from PySide6.QtGui import QIcon, QCursor
-from PySide6.QtWidgets import QLabel, QTableWidget, QHeaderView
-from utils.setting import history_table_height, temp_deliminator
+from PySide6.QtWidgets import (QWidget, QVBoxLayout, QTableView, QScrollArea, QHeaderView, QHBoxLayout, QLineEdit,
+                               QStyledItemDelegate, QStyleOptionViewItem, QStyle, QAbstractItemView)
+from PySide6.QtCore import Signal, Qt, QAbstractTableModel, QModelIndex
+from PySide6.QtGui import QIcon, QFont, QPalette, QTextDocument, QAbstractTextDocumentLayout
+from utils.setting import history_table_height, snippet_start, snippet_end
 import datetime
-from models.llm_client_worker import LLMResults
+import html
+from typing import List
+from models.database_manager import HistorySummary
 
-class CustomTableWidget(QTableWidget):
-    item_selected = Signal(dict)
+# data role of the highlighted search snippet of a cell (HTML, None if not a search result)
+SnippetRole = Qt.UserRole + 1
+delete_column = 3
+# looked up once: data() runs for every cell and role on each repaint, and
+# reading an enum from Qt costs microseconds
+DisplayRole, ToolTipRole, FontRole = Qt.DisplayRole, Qt.ToolTipRole, Qt.FontRole
+
+def date_label(item_datetime:str) -> str:
+    date_time = datetime.datetime.fromisoformat(item_datetime.split('.')[0])
+    today = datetime.date.today()
+
+    if date_time.date() == today:
+        return date_time.strftime("%H:%M")
+    elif date_time.date() == today - datetime.timedelta(days=1):
+        return "Yesterday"
+    elif date_time.year == today.year:
+        return date_time.strftime("%m/%d")
+    else:
+        return date_time.strftime("%Y/%m/%d")
+
+def snippet_html(snippet:str) -> str:
+    text = html.escape(snippet).replace(snippet_start, "<b style='background-color: #ffe066; color: black;'>").replace(snippet_end, "</b>")
+    return text.replace("\n", " ")
+
+class HistoryTableModel(QAbstractTableModel):
+    """
+    The rows of the history list, newest first. Cell text, tooltips and
+    snippets are made when the view asks for them, i.e. only for the rows
+    on screen.
+
+    When more rows are stored than listed, scrolling to the end emits
+    more_requested(page_key of the last row); the controller answers with
+    append_items().
+    """
+    more_requested = Signal(object)
+    headers = ['Query', 'Response', 'Model', '']
+
+    def __init__(self):
+        super().__init__()
+        self.items: List[HistorySummary] = []
+        self.more = False
+        self.font = QFont()
+        self.font.setPointSize(10)
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.items)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.headers)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return self.headers[section]
+        return None
+
+    def data(self, index, role=DisplayRole):
+        column = index.column()
+        if column == delete_column or not index.isValid():
+            return None
+        item = self.items[index.row()]
+
+        if role == DisplayRole or role == ToolTipRole:
+            if column == 0:
+                text = item.prompt_preview
+            elif column == 1:
+                text = item.response_preview
+            else:
+                text = item.model + "\n" + date_label(item.datetime)
+            if role == ToolTipRole:
+                return f"<span style='white-space:pre-wrap;'>{html.escape(text)}</span>"
+            return text
+        elif role == FontRole:
+            return self.font
+        elif role == SnippetRole:
+            return self.snippet(index)
+        return None
+
+    def snippet(self, index) -> str:
+        """The highlighted search match of a prompt / response cell, None if it has none."""
+        if index.column() >= 2 or not index.isValid():
+            return None
+        item = self.items[index.row()]
+        snippet = item.prompt_snippet if index.column() == 0 else item.response_snippet
+        return snippet_html(snippet) if snippet is not None else None
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and self.more
+
+    def fetchMore(self, parent=QModelIndex()):
+        # not again until the controller has answered
+        self.more = False
+        self.more_requested.emit(self.items[-1].page_key if self.items else None)
+
+    def item(self, row:int) -> HistorySummary:
+        return self.items[row]
+
+    def set_items(self, items:List[HistorySummary], more:bool = False):
+        self.beginResetModel()
+        self.items = list(items)
+        self.more = more
+        self.endResetModel()
+
+    def append_items(self, items:List[HistorySummary], more:bool):
+        if items:
+            self.beginInsertRows(QModelIndex(), len(self.items), len(self.items) + len(items) - 1)
+            self.items.extend(items)
+            self.endInsertRows()
+        self.more = more
+
+    def insert_items(self, items:List[HistorySummary], at_top:bool = False):
+        """
+        Add new rows, newest first, where they belong in the list (not past its
+        end, which the next page lists) or above all rows (search results).
+        Rows going to the same place are inserted together.
+        """
+        blocks = []
+        row = 0
+        for item in items:
+            if not at_top:
+                while row < len(self.items) and self.items[row].page_key > item.page_key:
+                    row += 1
+                if row == len(self.items) and self.more:
+                    break
+            if blocks and blocks[-1][0] == row:
+                blocks[-1][1].append(item)
+            else:
+                blocks.append((row, [item]))
+
+        # from the end, so that the rows of the other blocks don't move
+        for row, block in reversed(blocks):
+            self.beginInsertRows(QModelIndex(), row, row + len(block) - 1)
+            self.items[row:row] = block
+            self.endInsertRows()
+
+    def remove_ids(self, ids:List[int]):
+        for row in sorted((row for row, item in enumerate(self.items) if item.id in ids), reverse=True):
+            self.beginRemoveRows(QModelIndex(), row, row)
+            del self.items[row]
+            self.endRemoveRows()
+
+class HistoryItemDelegate(QStyledItemDelegate):
+    """Paints the search snippets as highlighted rich text and the delete icon, instead of a widget per cell."""
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.delete_icon = QIcon.fromTheme('edit-delete').pixmap(16, 16)
+        self.document = QTextDocument()
+
+    def paint(self, painter, option, index):
+        # from the model itself: index.data() returning None releases None once too often
+        # (PySide6 6.12 on Python 3.11), and this runs for every cell painted
+        snippet = index.model().snippet(index)
+        if index.column() != delete_column and snippet is None:
+            super().paint(painter, option, index)
+            return
+
+        # the cell's background (selection, hover) without its text
+        opt = QStyleOptionViewItem(option)
+        self.initStyleOption(opt, index)
+        opt.text = ""
+        widget = opt.widget
+        style = widget.style() if widget else None
+        if style:
+            style.drawControl(QStyle.CE_ItemViewItem, opt, painter, widget)
+
+        painter.save()
+        if index.column() == delete_column:
+            x = opt.rect.x() + (opt.rect.width() - self.delete_icon.width()) // 2
+            y = opt.rect.y() + (opt.rect.height() - self.delete_icon.height()) // 2
+            painter.drawPixmap(x, y, self.delete_icon)
+        else:
+            self.document.setDefaultFont(opt.font)
+            self.document.setHtml(snippet)
+            self.document.setTextWidth(opt.rect.width())
+            context = QAbstractTextDocumentLayout.PaintContext()
+            selected = opt.state & QStyle.State_Selected
+            context.palette.setColor(QPalette.Text, opt.palette.color(QPalette.HighlightedText if selected else QPalette.Text))
+            top = max(0, (opt.rect.height() - self.document.size().height()) / 2)
+            painter.translate(opt.rect.x(), opt.rect.y() + top)
+            painter.setClipRect(0, 0, opt.rect.width(), opt.rect.height() - top)
+            self.document.documentLayout().draw(painter, context)
+        painter.restore()
+
+class CustomTableView(QTableView):
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -17,7 +200,7 @@ class CustomTableWidget(QTableWidget):
 
         # Style the table
         self.setStyleSheet("""
-            QTableWidget {
+            QTableView {
                 border: 1px solid;
             }
             QHeaderView::section {
@@ -33,49 +216,34 @@ class CustomTableWidget(QTableWidget):
         self.verticalHeader().setVisible(False)
 
         # table should not be editable on double click
-        self.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.setEditTriggers(QAbstractItemView.NoEditTriggers)
 
         # Set selection behavior
-        self.setSelectionBehavior(QTableWidget.SelectRows)
-        self.setSelectionMode(QTableWidget.SingleSelection)
-
-        # Enable sorting
-        # self.setSortingEnabled(True)
-
-    def setItem(self, row, column, item):
-        if item is not None:
-            toolTipText = f"<span style='white-space:pre-wrap;'>{item.text()}</span>"
-            item.setToolTip(toolTipText)
-            
-            # Set a custom font
-            font = item.font()
-            font.setPointSize(10)
-            item.setFont(font)
-            
-        super().setItem(row, column, item)
-
-    # def resizeEvent(self, event):
-    #     # Adjust column widths when the table is resized
-    #     width = self.viewport().width()
-    #     for column in range(self.columnCount()):
-    #         self.setColumnWidth(column, width / self.columnCount())
-    #     super().resizeEvent(event)
+        self.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.setSelectionMode(QAbstractItemView.SingleSelection)
+
+        # pointing hand over the delete icons
+        self.setMouseTracking(True)
 
     def keyPressEvent(self, event):
         if event.key() == Qt.Key_Up or event.key() == Qt.Key_Down:
-            current_row = self.currentRow()
+            current_row = self.currentIndex().row()
             if event.key() == Qt.Key_Up and current_row > 0:
-                self.setCurrentCell(current_row - 1, 0)
-            elif event.key() == Qt.Key_Down and current_row < self.rowCount() - 1:
-                self.setCurrentCell(current_row + 1, 0)
-            
-            self.item_selected.emit(self.currentRow())
+                self.setCurrentIndex(self.model().index(current_row - 1, 0))
+            elif event.key() == Qt.Key_Down and current_row < self.model().rowCount() - 1:
+                self.setCurrentIndex(self.model().index(current_row + 1, 0))
             event.accept()
         else:
             super().keyPressEvent(event)
 
+    def mouseMoveEvent(self, event):
+        if self.indexAt(event.position().toPoint()).column() == delete_column:
+            self.viewport().setCursor(Qt.PointingHandCursor)
+        else:
+            self.viewport().unsetCursor()
+        super().mouseMoveEvent(event)
+
 class HistoryPanel(QWidget):
-    # item_selected = Signal(dict)
 
     def __init__(self, db_manager, logger):
         super().__init__()
@@ -93,45 +261,21 @@ class HistoryPanel(QWidget):
         self.layout.addLayout(search_layout)
 
         # table
-        self.table_widget = CustomTableWidget()
-        self.table_widget.verticalHeader().setVisible(False)
-        self.table_widget.setColumnCount(4)
-        self.table_widget.setHorizontalHeaderLabels(['Query', 'Response', 'Model', ''])
-        
+        self.model = HistoryTableModel()
+        self.table_view = CustomTableView()
+        self.table_view.setModel(self.model)
+        self.table_view.setItemDelegate(HistoryItemDelegate(self.table_view))
+
         # header
-        header = self.table_widget.horizontalHeader()
+        header = self.table_view.horizontalHeader()
         header.setSectionResizeMode(QHeaderView.Stretch)
 
-        # set the column width
-        header.setSectionResizeMode(3, QHeaderView.ResizeToContents)
-        
+        # set the column width (fixed: fitting it to the contents would look at every row)
+        header.setSectionResizeMode(delete_column, QHeaderView.Fixed)
+        header.resizeSection(delete_column, 32)
+
         scroll_area = QScrollArea()
         scroll_area.setWidgetResizable(True)
-        scroll_area.setWidget(self.table_widget)
-        
-        self.layout.addWidget(scroll_area)
-
-
-    def set_one_row_to_table(self, row:int, item:LLMResults):
-        date_time = item.datetime.split('.')[0]
-        date_time = datetime.datetime.fromisoformat(date_time)
+        scroll_area.setWidget(self.table_view)
 
-        if date_time.date() == datetime.date.today():
-            date_str = date_time.strftime("%H:%M")
-        elif date_time.date() == datetime.date.today() - datetime.timedelta(days=1):
-            date_str = "Yesterday"
-        elif date_time.year == datetime.date.today().year:
-            date_str = date_time.strftime("%m/%d")
-        else:
-            date_str = date_time.strftime("%Y/%m/%d")
-
-        datetime_model = item.model + "\n" + date_str
-
-        self.table_widget.setItem(row, 0, QTableWidgetItem(item.prompt))
-        self.table_widget.setItem(row, 1, QTableWidgetItem(item.response))
-        self.table_widget.setItem(row, 2, QTableWidgetItem(datetime_model))
-
-        delete_label = QLabel()
-        delete_label.setPixmap(QIcon.fromTheme('edit-delete').pixmap(16, 16))
-        delete_label.setCursor(QCursor(Qt.PointingHandCursor))
-        self.table_widget.setCellWidget(row, 3, delete_label)
+        self.layout.addWidget(scroll_area)
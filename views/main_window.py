@@ -72,5 +72,6 @@ class MainWindow(QMainWindow):
 
     def closeEvent(self, event):
         self.db.close()
+        self.clients.close()
         self.logger.info("App Closed")
         event.accept()
\ No newline at end of file
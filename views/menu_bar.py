@@ -5,6 +5,7 @@ from utils.setting import deliminator, n_prompt_buttons
 class MenuBar(QMenuBar):
 
     prompt_selected = Signal(str)
+    stats_signal = Signal()
 
     def __init__(self, parent, prompts, logger):
         super().__init__(parent)
@@ -27,5 +28,11 @@ class MenuBar(QMenuBar):
                 action.triggered.connect(lambda checked=False, p=prompt_text: self.insert_prompt(p))
                 self.logger.debug(f"Added prompt to the menubar: {prompt_name}")
 
+        tools_menu = QMenu("Tools", self)
+        self.addMenu(tools_menu)
+
+        stats_action = tools_menu.addAction("Model statistics")
+        stats_action.triggered.connect(self.stats_signal.emit)
+
     def insert_prompt(self, prompt_text):
         self.prompt_selected.emit(prompt_text)
\ No newline at end of file
@@ -1,16 +1,14 @@
 from PySide6.QtWidgets import QVBoxLayout, QRadioButton, QButtonGroup, QWidget
 from PySide6.QtGui import QShortcut, QKeySequence
-from PySide6.QtWidgets import QLabel, QSlider
+from PySide6.QtWidgets import QLabel, QSlider, QCheckBox
 from PySide6.QtCore import Qt
 
 class ModelSelectionPanel(QWidget):
-    def __init__(self, openai_models, anthropic_models, perplexity_models, logger):
+    def __init__(self, models, logger):
         super().__init__()
         self.logger = logger
         self.model_group = QButtonGroup()
-        self.openai_models = openai_models
-        self.anthropic_models = anthropic_models
-        self.perplexity_models = perplexity_models
+        self.models = models
 
         self.layout = QVBoxLayout(self)
         self.setLayout(self.layout)
@@ -22,12 +20,12 @@ class ModelSelectionPanel(QWidget):
         # insert text
         self.layout.addWidget(QLabel("Select Model:"))
 
-        if self.openai_models:
-            self.add_model_buttons(self.openai_models)
-        if self.anthropic_models:
-            self.add_model_buttons(self.anthropic_models)
-        if self.perplexity_models:
-            self.add_model_buttons(self.perplexity_models)
+        # multi-select: send the prompt to all checked models at once
+        self.compare_checkbox = QCheckBox("Compare models")
+        self.compare_checkbox.toggled.connect(self.set_compare_mode)
+        self.layout.addWidget(self.compare_checkbox)
+
+        self.add_model_buttons(self.models)
 
         if self.model_group.buttons():
             self.model_group.buttons()[0].setChecked(True)
@@ -52,16 +50,53 @@ class ModelSelectionPanel(QWidget):
 
 
     def add_model_buttons(self, models):
-        for model in models.keys():
+        for model in models:
             button = QRadioButton(model)
             self.layout.addWidget(button)
             self.model_group.addButton(button)
 
     def selected_model(self):
-        button = self.model_group.checkedButton()
-        return button.text() if button else None
-    
+        models = self.selected_models()
+        return models[0] if models else None
+
+    def selected_models(self):
+        return [button.text() for button in self.model_group.buttons() if button.isChecked()]
+
+    def compare_mode(self):
+        return self.compare_checkbox.isChecked()
+
+    def set_compare_mode(self, enabled:bool):
+        if enabled:
+            self.model_group.setExclusive(False)
+            return
+
+        # back to a single selection: keep the first checked model
+        selected = self.selected_model()
+        for button in self.model_group.buttons():
+            button.setChecked(button.text() == selected)
+        self.model_group.setExclusive(True)
+        if self.model_group.checkedButton() is None and self.model_group.buttons():
+            self.model_group.buttons()[0].setChecked(True)
+
+    def selection(self):
+        """(checked models, compare mode, temperature), for set_selection()."""
+        return self.selected_models(), self.compare_mode(), self.temperature_slider.value()
+
+    def set_selection(self, selection):
+        models, compare, temperature = selection
+        self.compare_checkbox.setChecked(compare)
+        if compare:
+            for button in self.model_group.buttons():
+                button.setChecked(button.text() in models)
+        elif models:
+            self.set_selected_model(models[0])
+        self.temperature_slider.setValue(temperature)
+
     def set_selected_model(self, model_name):
+        # keep the user's multi-selection while comparing
+        if self.compare_mode():
+            return
+
         for button in self.model_group.buttons():
             if button.text() == model_name:
                 button.setChecked(True)
@@ -1,4 +1,68 @@
+from PySide6.QtGui import QTextCursor, QTextDocument, QTextDocumentFragment
+from PySide6.QtCore import QTimer
 from views.text_edit_with_zoom import ResizableTextEdit
+from utils.setting import markdown_chunk_threshold, markdown_chunk_size
+import re
+from typing import List
+
+list_item = re.compile(r"([-*+]|\d+[.)])\s")
+# a code fence, after any list item and block quote markers (group 1): opening and closing
+fence_open = re.compile(r"((?:\s*(?:[-*+]|\d+[.)])\s|\s*>)*\s*)(`{3,}|~{3,})(.*)$")
+fence_close = re.compile(r"((?:\s*>)*\s*)(`{3,}|~{3,})\s*$")
+# HTML blocks that may contain blank lines, with what ends them (CommonMark types 1-5)
+html_block = re.compile(r" {0,3}<(?:(script|pre|style|textarea)(?:[\s>]|$)|(!--)|(\?)|(![A-Za-z])|(!\[CDATA\[))", re.IGNORECASE)
+html_block_end = {1: "</{}>", 2: "-->", 3: "?>", 4: ">", 5: "]]>"}
+# a link reference definition applies to the whole text, the chunks are parsed on their own
+link_definition = re.compile(r"^ {0,3}\[[^\]]+\]:", re.MULTILINE)
+
+def markdown_chunks(text:str, size:int) -> List[str]:
+    """
+    Split Markdown into pieces of about size characters that parse the same
+    on their own: only before an unindented line following a blank one, which
+    is not a list item (the list would be cut in two) or inside a code fence
+    or an HTML block. Text with link reference definitions is not split.
+    """
+    if link_definition.search(text):
+        return [text]
+
+    chunks = []
+    start = pos = 0
+    fence = None # (character, length, column) of the open code fence
+    html_end = None
+    blank = False
+    for line in text.splitlines(keepends=True):
+        stripped = line.lstrip()
+        if pos - start >= size and blank and fence is None and html_end is None and stripped and not line[0].isspace() and not list_item.match(line):
+            chunks.append(text[start:pos])
+            start = pos
+        pos += len(line)
+        blank = not stripped
+
+        content = line.rstrip("\r\n")
+        if fence is not None:
+            # closed by the same character, at least as many, and nothing else on the line
+            m = fence_close.match(content)
+            if m and m[2][0] == fence[0] and len(m[2]) >= fence[1] and len(m[1]) <= fence[2] + 3:
+                fence = None
+            continue
+        if html_end is not None:
+            if html_end in content.lower():
+                html_end = None
+            continue
+
+        m = fence_open.match(content)
+        if m and not (m[2][0] == "`" and "`" in m[3]):
+            fence = (m[2][0], len(m[2]), len(m[1]))
+            continue
+        m = html_block.match(content)
+        if m:
+            kind = m.lastindex
+            end_marker = html_block_end[kind].format((m[1] or "").lower())
+            # the end may be on the opening line, after the start
+            if end_marker not in content[m.end():].lower():
+                html_end = end_marker
+    chunks.append(text[start:])
+    return chunks
 
 class OutputArea(ResizableTextEdit):
     def __init__(self, parent=None):
@@ -6,11 +70,35 @@ class OutputArea(ResizableTextEdit):
         self.text_edit.setReadOnly(True)
         self.text_edit.setPlaceholderText("Output will appear here.")
         self.text_edit.setAcceptRichText(False)
+        # a document from render() shown as is (e.g. from the RenderCache), not owned by the text edit
+        self.rendered = None
+
+        # Markdown still to be added to self.rendered, a chunk per timeout (see load_markdown())
+        self.chunks = []
+        self.chunks_done = None
+        self.chunk_timer = QTimer(self)
+        self.chunk_timer.setInterval(0)
+        self.chunk_timer.timeout.connect(self.load_next_chunk)
+
+    def detach(self):
+        """Show a document of the text edit's own again, before changing the text: the rendered one may be cached."""
+        self.stop_loading()
+        if self.rendered is not None:
+            document = QTextDocument(self.text_edit)
+            document.setDefaultFont(self.text_edit.font())
+            self.text_edit.setDocument(document)
+            self.rendered = None
 
     def clear(self):
+        self.detach()
         self.text_edit.setPlainText("")
 
-    def set_text(self, text:str, style:bool):
+    def set_text(self, text:str, style:bool, done=None):
+        """
+        done(document) is called once long Markdown, shown in chunks, is complete
+        (not if other text is shown before); the document can go to show_rendered().
+        """
+        self.detach()
         self.text_edit.clear()
         self.text_edit.setStyleSheet("")
 
@@ -18,5 +106,95 @@ class OutputArea(ResizableTextEdit):
             self.text_edit.setPlainText(text)
             return
 
+        elif len(text) > markdown_chunk_threshold:
+            self.load_markdown(text, done)
+
         else:
-            self.text_edit.setMarkdown(text)
\ No newline at end of file
+            self.text_edit.setMarkdown(text)
+
+    def load_markdown(self, text:str, done=None):
+        """
+        Parse long Markdown a chunk at a time between events, into a document
+        shown from the first chunk on; the window stays responsive meanwhile.
+        Parsing in a thread would not help: the GIL is held while Qt parses.
+        """
+        chunks = markdown_chunks(text, markdown_chunk_size)
+        document = QTextDocument()
+        document.setDefaultFont(self.text_edit.font())
+        document.setMarkdown(chunks[0])
+        self.text_edit.setDocument(document)
+        self.rendered = document
+
+        self.chunks = chunks[:0:-1]
+        self.chunks_done = done
+        self.chunk_timer.start()
+
+    def load_next_chunk(self):
+        # none left if the text was a single chunk: done() is still called from here
+        if self.chunks:
+            part = QTextDocument()
+            part.setMarkdown(self.chunks.pop())
+            cursor = QTextCursor(self.rendered)
+            cursor.movePosition(QTextCursor.End)
+            # the chunk starts a new block, of its own format; a table (after an empty block) brings its own.
+            # Not currentTable(): PySide6 releases the None it returns outside a table once too often
+            first = part.begin()
+            starts_with_table = not first.text() and first.next().isValid() and QTextCursor(first.next()).currentFrame().format().isTableFormat()
+            if not starts_with_table:
+                cursor.insertBlock(first.blockFormat(), first.charFormat())
+            cursor.insertFragment(QTextDocumentFragment(part))
+
+        if not self.chunks:
+            done = self.chunks_done
+            self.stop_loading()
+            if done is not None:
+                done(self.rendered)
+
+    def stop_loading(self):
+        self.chunk_timer.stop()
+        self.chunks = []
+        self.chunks_done = None
+
+    def render(self, text:str, style:bool):
+        """
+        The text prepared for show_rendered(): a QTextDocument already laid out
+        at the current width for Markdown, the text itself for plain text.
+        None for Markdown too long to render at once: set_text() shows it in chunks.
+        """
+        if not style:
+            return text
+        if len(text) > markdown_chunk_threshold:
+            return None
+
+        document = QTextDocument()
+        document.setDefaultFont(self.text_edit.font())
+        document.setMarkdown(text)
+        document.setTextWidth(self.text_edit.viewport().width())
+        document.size()
+        return document
+
+    def show_rendered(self, rendered):
+        self.stop_loading()
+        if isinstance(rendered, str):
+            self.set_text(rendered, False)
+            return
+
+        self.text_edit.setStyleSheet("")
+        # zoomed since it was rendered
+        if rendered.defaultFont() != self.text_edit.font():
+            rendered.setDefaultFont(self.text_edit.font())
+        self.text_edit.setDocument(rendered)
+        self.rendered = rendered
+
+    def append_text(self, text:str):
+        self.detach()
+        # insert at the end without moving the user's cursor/selection
+        scroll_bar = self.text_edit.verticalScrollBar()
+        at_bottom = scroll_bar.value() == scroll_bar.maximum()
+
+        cursor = QTextCursor(self.text_edit.document())
+        cursor.movePosition(QTextCursor.End)
+        cursor.insertText(text)
+
+        if at_bottom:
+            scroll_bar.setValue(scroll_bar.maximum())
@@ -0,0 +1,50 @@
+from collections import OrderedDict
+from PySide6.QtGui import QTextDocument
+from models.llm_client_worker import LLMResults
+from typing import Tuple
+
+# a laid-out Markdown document takes about 20 times the UTF-16 size of its text (measured)
+document_bytes_per_char = 40
+
+class RenderCache:
+    """
+    History items ready to show, by (history id, style): the item and its
+    response as made by OutputArea.render() (a QTextDocument for Markdown,
+    the text itself for plain). The least recently used entries go once the
+    estimated size passes max_bytes.
+    """
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+
+    def get(self, id: int, style: bool) -> Tuple[LLMResults, object]:
+        """(item, rendered response), or None."""
+        entry = self.entries.get((id, style))
+        if entry is None:
+            return None
+        self.entries.move_to_end((id, style))
+        return entry[0], entry[1]
+
+    def put(self, id: int, style: bool, result: LLMResults, rendered) -> Tuple[LLMResults, object]:
+        self.pop((id, style))
+        size = 2 * (len(result.prompt) + len(result.response))
+        if isinstance(rendered, QTextDocument):
+            size += document_bytes_per_char * len(result.response)
+        self.entries[(id, style)] = (result, rendered, size)
+        self.size += size
+
+        # the newest entry stays, even if larger than max_bytes on its own
+        while self.size > self.max_bytes and len(self.entries) > 1:
+            _, (_, _, evicted) = self.entries.popitem(last=False)
+            self.size -= evicted
+        return result, rendered
+
+    def discard(self, id: int):
+        for style in (True, False):
+            self.pop((id, style))
+
+    def pop(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.size -= entry[2]
@@ -17,13 +17,7 @@ class RightPanel(QWidget):
         self.layout.setContentsMargins(0, 0, 0, 0)
         self.config = config
 
-        self.openai_clients = clients.openai_client
-        self.anthropic_clients = clients.anthropic_client
-        self.perplexity_clients = clients.perplexity_client
-
-        self.openai_models = self.config.openai_models
-        self.anthropic_models = self.config.anthropic_models
-        self.perplexity_models = self.config.perplexity_models
+        self.providers = clients.providers
 
         self.prompts = self.config.prompts
 
@@ -37,7 +31,7 @@ class RightPanel(QWidget):
 
         # Model Selection
         self.model_selection_panel = ModelSelectionPanel(
-            self.openai_models, self.anthropic_models, self.perplexity_models, self.logger
+            self.providers.model_names(), self.logger
         )
         self.layout.addWidget(self.model_selection_panel)
 
@@ -0,0 +1,56 @@
+from PySide6.QtWidgets import QWidget, QVBoxLayout, QSplitter
+from PySide6.QtCore import Qt
+
+from views.prompt_input_panel import PromptInputPanel
+from views.output_area import OutputArea
+from views.compare_panel import ComparePanel
+
+import utils.messages as messages
+
+
+class SessionPanel(QWidget):
+    """A tab of the center panel: one conversation's input and output."""
+
+    def __init__(self, prompts, parent=None):
+        super().__init__(parent)
+        self.layout = QVBoxLayout(self)
+        self.layout.setContentsMargins(0, 0, 0, 0)
+        self.prompts = prompts
+
+        self.init_ui()
+        self.output_area.set_text(messages.welcome_message, style=True)
+
+    def init_ui(self):
+        splitter = QSplitter(Qt.Vertical)
+
+        # Prompt input
+        self.input_panel = PromptInputPanel(self.prompts)
+
+        # Output area
+        self.output_area = OutputArea()
+
+        # Side-by-side output areas for comparing models (hidden until used)
+        self.compare_panel = ComparePanel()
+        self.compare_panel.hide()
+
+        splitter.addWidget(self.input_panel)
+        splitter.addWidget(self.output_area)
+        splitter.addWidget(self.compare_panel)
+        splitter.setSizes([300, 500, 500])
+        self.layout.addWidget(splitter)
+
+    def show_output_area(self):
+        self.compare_panel.hide()
+        self.output_area.show()
+
+    def show_compare_panel(self, panes):
+        self.compare_panel.set_panes(panes)
+        self.output_area.hide()
+        self.compare_panel.show()
+
+    def clear_textboxes(self):
+        self.show_output_area()
+        self.input_panel.clear_text()
+        self.output_area.clear()
+        self.output_area.set_text(messages.welcome_message, style=True)
+        self.input_panel.textarea.setFocus()
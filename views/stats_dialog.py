@@ -0,0 +1,46 @@
+from PySide6.QtWidgets import QDialog, QVBoxLayout, QTableWidget, QTableWidgetItem, QHeaderView, QLabel
+from PySide6.QtCore import Qt
+from typing import List
+
+
+class StatsDialog(QDialog):
+    """Per-model latency and throughput, from DatabaseManager.get_model_stats()."""
+
+    columns = [
+        ("Model", "model", "{}"),
+        ("Requests", "n", "{}"),
+        ("p50 (s)", "p50_ms", "{:.2f}"),
+        ("p95 (s)", "p95_ms", "{:.2f}"),
+        ("p99 (s)", "p99_ms", "{:.2f}"),
+        ("First byte (s)", "ttfb_ms", "{:.2f}"),
+        ("Queue (s)", "queue_ms", "{:.2f}"),
+        ("Input tokens", "input_tokens", "{}"),
+        ("Output tokens", "output_tokens", "{}"),
+        ("Tokens/s", "tokens_per_s", "{:.1f}"),
+        ("Retries", "retries", "{}"),
+    ]
+
+    def __init__(self, stats: List[dict], parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Model statistics")
+        self.resize(900, 300)
+        layout = QVBoxLayout(self)
+
+        layout.addWidget(QLabel("Requests answered by the provider (cached responses and errors are not counted)."))
+
+        self.table_widget = QTableWidget(len(stats), len(self.columns))
+        self.table_widget.setHorizontalHeaderLabels([title for title, _, _ in self.columns])
+        self.table_widget.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeToContents)
+        self.table_widget.verticalHeader().setVisible(False)
+        self.table_widget.setEditTriggers(QTableWidget.NoEditTriggers)
+        layout.addWidget(self.table_widget)
+
+        for row, model_stats in enumerate(stats):
+            for column, (_, key, fmt) in enumerate(self.columns):
+                value = model_stats[key]
+                if value is not None and key.endswith("_ms"):
+                    value = value / 1000
+                item = QTableWidgetItem("-" if value is None else fmt.format(value))
+                if column > 0:
+                    item.setTextAlignment(Qt.AlignRight | Qt.AlignVCenter)
+                self.table_widget.setItem(row, column, item)